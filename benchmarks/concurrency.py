@@ -0,0 +1,116 @@
+# Search throughput with many concurrent readers, the way Streamlit sessions share the app's
+# ConnectionPool: N threads each take searches off a shared list and run them on their own
+# read-only connection. Reports searches per second, the speedup over one thread and the
+# latency each search saw, for each thread count - and again with shared_cache=True.
+#
+#     python benchmarks/concurrency.py --db travel.db --threads 1,2,4,8 --searches 200
+#
+# --workload query only times the hotels query (all SQLite, which runs without the GIL), while
+# search times the whole search including pricing. Without --db a synthetic database is
+# generated (see booker.synthetic). Scaling is capped by the number of CPUs.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.db import ConnectionPool, query_hotels
+from booker.search import SearchParams, search
+from booker.synthetic import generate_db
+
+
+WORKLOADS = {
+    "query": lambda conn, params: query_hotels(conn, *params[:3], *params[4:9]),
+    "search": lambda conn, params: search(params, conn),
+}
+
+
+# Typical searches (a week to three months, with and without filters) over the cities and
+# dates in the database
+def make_searches(db_path, n, seed):
+    pool = ConnectionPool(db_path)
+    conn = pool.connection()
+    cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels")]
+    first, last = conn.execute("SELECT MIN(checkin_date), MAX(checkin_date) FROM hotels").fetchone()
+    pool.close()
+    first = date.fromisoformat(first[:10])
+    last = date.fromisoformat(last[:10])
+    rng = random.Random(seed)
+    searches = []
+    for _ in range(n):
+        from_ = first + timedelta(days=rng.randint(0, max((last - first).days - 7, 0)))
+        to_ = min(from_ + timedelta(days=rng.choice([7, 30, 60, 90])), last)
+        searches.append(SearchParams(rng.choice(cities), from_, to_, rng.choice([3, 7, 14]),
+                                     rng.choice([0, 50]), rng.choice([5000, 300]),
+                                     rng.choice([6.0, 8.0]), 9.9, rng.choice([0, 100])))
+    return searches
+
+
+def run(db_path, searches, threads, workload, shared_cache):
+    pool = ConnectionPool(db_path, shared_cache=shared_cache)
+    func = WORKLOADS[workload]
+    latencies = []
+    lock = threading.Lock()
+
+    def one(params):
+        start = time.perf_counter()
+        func(pool.connection(), params)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    # One untimed pass per thread, so every connection is open and the file is in the page cache
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, searches[:threads]))
+        latencies.clear()
+        start = time.perf_counter()
+        list(executor.map(one, searches))
+        wall = time.perf_counter() - start
+    pool.close()
+    return wall, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search throughput with concurrent readers")
+    parser.add_argument("--db", help="existing database to use instead of a synthetic one")
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--hotels", type=int, default=300, help="hotels per city")
+    parser.add_argument("--days", type=int, default=190)
+    parser.add_argument("--threads", default="1,2,4,8", help="comma separated thread counts")
+    parser.add_argument("--searches", type=int, default=200, help="searches per run")
+    parser.add_argument("--workload", choices=WORKLOADS, default="query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(tmp, "travel.db")
+            generate_db(db_path, args.cities, args.hotels, args.days, start=date(2026, 1, 5))
+
+        searches = make_searches(db_path, args.searches, args.seed)
+        print(f"{len(searches)} searches ({args.workload}), {os.cpu_count()} CPUs\n")
+        print(f"{'cache':<8} {'threads':>7} {'searches/s':>11} {'speedup':>8} "
+              f"{'p50 ms':>9} {'p95 ms':>9}")
+        for shared_cache in (False, True):
+            single = None
+            for threads in [int(n) for n in args.threads.split(",")]:
+                wall, latencies = run(db_path, searches, threads, args.workload, shared_cache)
+                throughput = len(searches)/wall
+                single = single or throughput
+                p95 = latencies[min(int(len(latencies)*0.95), len(latencies) - 1)]
+                print(f"{'shared' if shared_cache else 'private':<8} {threads:>7} {throughput:>11.1f} "
+                      f"{throughput/single:>7.2f}x {statistics.median(latencies)*1000:>9.1f} "
+                      f"{p95*1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Load test for the Streamlit app: N simulated sessions, each driving streamlit_booker.py
+# headlessly with Streamlit's AppTest, make realistic searches (a city, a window of a week to
+# three months, a holiday length and sometimes filters or another sort) one after another
+# against a synthetic travel.db, waiting for each to finish as a user would:
+#
+#     python benchmarks/load_test.py --sessions 8 --searches 5
+#     python benchmarks/load_test.py --sessions 8 --save load.json
+#     python benchmarks/load_test.py --sessions 8 --compare load.json
+#
+# Sessions run on threads of one process, as they do in one Streamlit server, so they share
+# the app's connection pool, search jobs and result cache. AppTest can only run one script at
+# a time in a process, so the sessions' reruns take turns (as they would for the GIL anyway),
+# while the searches they start run at once in the app's job threads. Searches are drawn from a pool of
+# --distinct searches, so some are repeats answered from the cache as they would be in use.
+# Reports searches per second, p50/p95/p99 latency from clicking Search to the results
+# showing, and the process's RSS growth per session (multi-city worker processes are not
+# counted). With --compare, more than --threshold times worse on any of them is reported and
+# the script exits with status 1.
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP = os.path.join(ROOT, "streamlit_booker.py")
+
+from booker.cities import load_cities
+from booker.search import SORT_OPTIONS
+from booker.synthetic import generate_db
+
+
+# Current resident set size in MB (peak so far where /proc isn't available)
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak/2**20 if sys.platform == "darwin" else peak/1024
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, every=0.1):
+        super().__init__(daemon=True)
+        self.every = every
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.every):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# (city, from, to, nights, sort, min_reviews) for searches the app can make on the database
+def make_searches(cities, today, days, n, seed):
+    rng = random.Random(seed)
+    searches = []
+    for _ in range(n):
+        from_ = today + timedelta(days=rng.randint(0, min(days - 10, 150)))
+        to_ = min(from_ + timedelta(days=rng.choice([7, 14, 30, 60, 90])), today + timedelta(days=min(days - 1, 182)))
+        nights = rng.randint(2, min((to_ - from_).days, 14))
+        sort = rng.choice(SORT_OPTIONS)
+        min_reviews = rng.choice([0, 0, 0, 100, 1000])
+        searches.append((rng.choice(cities), from_, to_, nights, sort, min_reviews))
+    return searches
+
+
+# AppTest's script runs share Streamlit's runtime globals, one at a time
+RUN_LOCK = threading.Lock()
+
+
+def rerun(at):
+    with RUN_LOCK:
+        return at.run()
+
+
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+# One session: open the app, then make each search and wait for its results
+def session(searches, latencies, errors, poll, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = rerun(AppTest.from_file(APP, default_timeout=timeout))
+    for city, from_, to_, nights, sort, min_reviews in searches:
+        # To's limits depend on From, so it's a new widget once From changes
+        widget(at.selectbox, "Hotel Location:").select(city)
+        widget(at.date_input, "From:").set_value(from_)
+        rerun(at)
+        widget(at.date_input, "To:").set_value(to_)
+        rerun(at)
+        widget(at.slider, "Holiday Duration (Days):").set_value(nights)
+        widget(at.selectbox, "Sort By:").select(sort)
+        widget(at.number_input, "Min. # of reviews:").set_value(min_reviews)
+        rerun(at)
+
+        start = time.perf_counter()
+        widget(at.button, "Search").click()
+        rerun(at)
+        while not (at.success or at.error or at.exception):
+            if time.perf_counter() - start > timeout:
+                break
+            time.sleep(poll)
+            rerun(at)
+        if at.success:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(str(at.exception[0].value) if at.exception
+                          else at.error[0].value if at.error else "timed out")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values)*q), len(values) - 1)] if values else float("nan")
+
+
+def run(db_path, sessions, searches_each, distinct, poll, timeout, seed, cities, today, days):
+    pool = make_searches(cities, today, days, distinct, seed)
+    rng = random.Random(seed)
+    plans = [[rng.choice(pool) for _ in range(searches_each)] for _ in range(sessions)]
+    latencies, errors = [], []
+
+    # The first run imports and caches everything the sessions share
+    from streamlit.testing.v1 import AppTest
+    AppTest.from_file(APP, default_timeout=timeout).run()
+    baseline = rss_mb()
+
+    sampler = RssSampler()
+    sampler.start()
+    threads = [threading.Thread(target=session, args=(plan, latencies, errors, poll, timeout))
+               for plan in plans]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    sampler.stop()
+
+    return {
+        "searches_per_s": len(latencies)/wall,
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "p99_s": percentile(latencies, 0.99),
+        "rss_per_session_mb": (sampler.peak - baseline)/sessions,
+        "peak_rss_mb": sampler.peak,
+        "searches": len(latencies),
+        "errors": len(errors),
+    }, errors
+
+
+# Metrics where more is worse, and the one where less is
+WORSE_IF_HIGHER = ("p50_s", "p95_s", "p99_s", "rss_per_session_mb")
+WORSE_IF_LOWER = ("searches_per_s",)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name in WORSE_IF_HIGHER + WORSE_IF_LOWER:
+        before, after = baseline.get(name), results[name]
+        if not before or not after:
+            continue
+        ratio = after/before if name in WORSE_IF_HIGHER else before/after
+        if ratio > threshold:
+            regressions.append(f"{name}: {before:.3f} -> {after:.3f} ({ratio:.2f}x worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with simulated sessions")
+    parser.add_argument("--db", help="existing database to use instead of a synthetic one")
+    parser.add_argument("--cities", type=int, default=10)
+    parser.add_argument("--hotels", type=int, default=150, help="hotels per city")
+    parser.add_argument("--days", type=int, default=190)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--searches", type=int, default=5, help="searches per session")
+    parser.add_argument("--distinct", type=int, default=50, help="size of the pool searches are drawn from")
+    parser.add_argument("--poll", type=float, default=0.1, help="seconds between reruns while waiting")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier --save to check against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="how many times worse counts as a regression")
+    args = parser.parse_args()
+
+    today = date.today()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(tmp, "travel.db")
+            # Starting today, as the app's dates do
+            generate_db(db_path, args.cities, args.hotels, args.days, start=today, seed=args.seed)
+        os.environ["BOOKER_DB"] = db_path
+        os.chdir(ROOT)
+
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        # Only cities the app offers can be picked
+        offered = set(load_cities())
+        cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels ORDER BY city")
+                  if row[0] in offered]
+        conn.close()
+        results, errors = run(db_path, args.sessions, args.searches, args.distinct, args.poll,
+                              args.timeout, args.seed, cities, today, args.days)
+
+    print(f"{args.sessions} sessions x {args.searches} searches, {os.cpu_count()} CPUs")
+    print(f"throughput         {results['searches_per_s']:8.2f} searches/s")
+    for name in ("p50_s", "p95_s", "p99_s"):
+        print(f"{name[:3]} latency        {results[name]*1000:8.0f} ms")
+    print(f"RSS per session    {results['rss_per_session_mb']:8.1f} MB (peak {results['peak_rss_mb']:.0f} MB)")
+    if errors:
+        print(f"{len(errors)} searches failed, eg. {errors[0]}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Compare search query latency before and after the booker.db query layer.
+#
+# "before" is the original f-string SELECT * query on a database without the search index,
+# "after" is the parameterised query once ensure_indexes has run. Point it at a full-size
+# travel.db (it works on a temporary copy, so the original file is left untouched):
+#
+#     python benchmarks/query_latency.py travel.db --searches 50
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.db import HOTELS_INDEX, HOTELS_QUERY, ensure_indexes, hotels_query_params
+
+
+def legacy_query(location, from_, to_, min_price, max_price, min_review_score,
+                 max_review_score, min_reviews):
+    return f"""SELECT *
+                FROM hotels
+                WHERE city = '{location}'
+                AND checkin_date >= '{from_}'
+                AND checkin_date <= '{to_}'
+                AND approx_price BETWEEN {min_price} AND {max_price}
+                AND rating >= {min_review_score}
+                AND rating <= {max_review_score}
+                AND reviews >= {min_reviews}
+
+                ORDER BY name, checkin_date
+                """
+
+
+# Random searches over the cities and dates actually in the database
+def make_searches(conn, n, seed):
+    rng = random.Random(seed)
+    cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels")]
+    first, last = conn.execute("SELECT MIN(checkin_date), MAX(checkin_date) FROM hotels").fetchone()
+    first = date.fromisoformat(first[:10])
+    last = date.fromisoformat(last[:10])
+    searches = []
+    for _ in range(n):
+        from_ = first + timedelta(days=rng.randint(0, max((last - first).days - 2, 0)))
+        to_ = min(from_ + timedelta(days=rng.choice([7, 30, 90, 182])), last)
+        searches.append((rng.choice(cities), from_, to_, 0, 5000, 6.0, 9.9, 0))
+    return searches
+
+
+def time_searches(conn, searches, run):
+    timings = []
+    for search in searches:
+        start = time.perf_counter()
+        run(conn, search)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarise(label, timings):
+    timings = sorted(timings)
+    mean = sum(timings)/len(timings)
+    p50 = timings[len(timings)//2]
+    p95 = timings[min(int(len(timings)*0.95), len(timings) - 1)]
+    print(f"{label:<8} mean {mean*1000:9.2f} ms   p50 {p50*1000:9.2f} ms   p95 {p95*1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search query latency before/after the index")
+    parser.add_argument("db", help="path to travel.db")
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "travel.db")
+        shutil.copyfile(args.db, db_path)
+
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"DROP INDEX IF EXISTS {HOTELS_INDEX}")
+        conn.commit()
+        searches = make_searches(conn, args.searches, args.seed)
+
+        before = time_searches(conn, searches,
+                               lambda conn, search: conn.execute(legacy_query(*search)).fetchall())
+        conn.close()
+
+        start = time.perf_counter()
+        ensure_indexes(db_path)
+        build = time.perf_counter() - start
+
+        conn = sqlite3.connect(db_path)
+        after = time_searches(conn, searches,
+                              lambda conn, search: conn.execute(HOTELS_QUERY, hotels_query_params(*search)).fetchall())
+        conn.close()
+
+    print(f"{len(searches)} searches, index built in {build:.2f} s")
+    summarise("before", before)
+    summarise("after", after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Memory used by one search's results, as search() returns them and in the compact form the
+# app caches (see booker.results), plus a check that the compact form expands back exactly.
+#
+#     python benchmarks/result_memory.py travel.db --city "Madrid, Spain" --days 182 --nights 7
+
+import argparse
+import os
+import pickle
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.db import open_db
+from booker.results import compact_results, expand_results
+from booker.search import SearchParams, search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search result memory: plain vs compact")
+    parser.add_argument("db", help="path to travel.db")
+    parser.add_argument("--city", required=True)
+    parser.add_argument("--from", dest="from_", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--days", type=int, default=182)
+    parser.add_argument("--nights", type=int, default=7)
+    args = parser.parse_args()
+
+    params = SearchParams(args.city, args.from_, args.from_ + timedelta(days=args.days), args.nights)
+    conn = open_db(args.db)
+    try:
+        results = search(params, conn)
+    finally:
+        conn.close()
+
+    compact = compact_results(results)
+    pd.testing.assert_frame_equal(results, expand_results(compact), check_exact=True)
+
+    print(f"{len(results)} stays, {results['name'].nunique()} hotels (round trip identical)")
+    print(f"{'':<10}{'memory MB':>12}{'pickled MB':>12}")
+    for label, df in [("plain", results), ("compact", compact)]:
+        memory = df.memory_usage(deep=True).sum()/1e6
+        pickled = len(pickle.dumps(df))/1e6
+        print(f"{label:<10}{memory:>12.2f}{pickled:>12.2f}")
+    plain = results.memory_usage(deep=True).sum()
+    print(f"compact is {plain/max(compact.memory_usage(deep=True).sum(), 1):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
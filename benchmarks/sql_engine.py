@@ -0,0 +1,119 @@
+# Cross-check the SQL engine (booker.sql_engine) against the pandas engine and time both, on
+# random searches over a synthetic travel.db (or --db). Every search is compared in full -
+# the same stays, prices, VM scores and links, with the sort keys in the same order - and
+# the top --limit stays are compared the same way.
+#
+#     python benchmarks/sql_engine.py --searches 50 --limit 100
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.db import open_db
+from booker.multi import merge_city_stays
+from booker.search import SORT_OPTIONS, SearchParams, find_stays, search
+from booker.synthetic import generate_db
+
+SORT_KEYS = {"Price": "approx_price", "Rating": "rating", "Price & Rating": "vm_score"}
+
+
+def random_searches(conn, n, seed):
+    rng = random.Random(seed)
+    cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels")]
+    first, last = conn.execute("SELECT MIN(checkin_date), MAX(checkin_date) FROM hotels").fetchone()
+    first = date.fromisoformat(first[:10])
+    last = date.fromisoformat(last[:10])
+    for _ in range(n):
+        from_ = first + timedelta(days=rng.randint(0, max((last - first).days - 2, 0)))
+        to_ = min(from_ + timedelta(days=rng.choice([7, 30, 90, 182])), last)
+        location = tuple(rng.sample(cities, 2)) if rng.random() < 0.2 else rng.choice(cities)
+        min_price = rng.choice([0, 0, 60])
+        min_review_score = rng.choice([6.0, 6.0, 8.0])
+        yield SearchParams(location, from_, to_, rng.randint(1, 30), min_price, 5000,
+                           min_review_score, 9.9, rng.choice([0, 0, 500]), rng.choice(SORT_OPTIONS))
+
+
+# The pandas engine, with several cities ranked together as search_cities does (in this
+# process rather than in worker processes)
+def pandas_search(params, conn):
+    if not isinstance(params.location, tuple):
+        return search(params, conn, materialized=False)
+    return merge_city_stays({city: find_stays(conn, city, *params[1:9], materialized=False)
+                             for city in params.location}, params.sort)
+
+
+# Same rows and values, and the same sequence of sort keys (ties may be in any order)
+def same_results(expected, actual, sort):
+    if expected.empty or actual.empty:
+        return expected.empty and actual.empty
+    key = SORT_KEYS[sort]
+    if expected[key].tolist() != actual[key].tolist():
+        return False
+    columns = list(expected.columns)
+    expected = expected.sort_values(columns).reset_index(drop=True)
+    actual = actual[columns].sort_values(columns).reset_index(drop=True)
+    return expected.astype(object).equals(actual.astype(object))
+
+
+# The first stays of the full results, apart from the order of tied sort keys
+def same_top(expected, top, sort, limit):
+    key = SORT_KEYS[sort]
+    if expected.empty or top.empty:
+        return expected.empty and top.empty
+    if expected[key].head(limit).tolist() != top[key].tolist():
+        return False
+    return len(top.merge(expected, on=list(expected.columns))) == len(top)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL engine vs pandas engine")
+    parser.add_argument("--db", help="existing database to use instead of a synthetic one")
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--hotels", type=int, default=200)
+    parser.add_argument("--days", type=int, default=190)
+    parser.add_argument("--searches", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or generate_db(os.path.join(tmp, "travel.db"), args.cities, args.hotels,
+                                         args.days, start=date(2026, 1, 5))
+        conn = open_db(db_path)
+        totals = {"pandas": 0.0, "sql": 0.0, "sql top-N": 0.0}
+        failures = 0
+        for params in random_searches(conn, args.searches, args.seed):
+            expected, pandas_time = timed(lambda: pandas_search(params, conn))
+            actual, sql_time = timed(lambda: search(params, conn, engine="sql"))
+            top, top_time = timed(lambda: search(params, conn, engine="sql", limit=args.limit))
+            totals["pandas"] += pandas_time
+            totals["sql"] += sql_time
+            totals["sql top-N"] += top_time
+
+            ok = (same_results(expected, actual, params.sort)
+                  and same_top(expected, top, params.sort, args.limit))
+            failures += not ok
+            print(f"{'ok  ' if ok else 'DIFF'} {len(expected):>7} stays  pandas {pandas_time*1000:8.1f} ms  "
+                  f"sql {sql_time*1000:8.1f} ms  top {args.limit} {top_time*1000:8.1f} ms  {params}")
+        conn.close()
+
+    print("\n" + "  ".join(f"{name} {seconds:.2f} s" for name, seconds in totals.items()))
+    if failures:
+        print(f"{failures} searches differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Measure how long the app takes to start and to rerun, before any search is made:
+#
+# - cold start: importing everything streamlit_booker.py imports, in a fresh interpreter
+#   (best of --repeat), with the slowest modules from python -X importtime
+# - first run and reruns: running the script with Streamlit's AppTest, which is what
+#   happens on every widget interaction
+#
+#     python benchmarks/startup.py --reruns 20
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP = os.path.join(ROOT, "streamlit_booker.py")
+
+
+# Modules imported at the top of the app (everything before the first st. call)
+def app_imports():
+    with open(APP) as f:
+        lines = [line for line in f if re.match(r"(import|from) \S+", line)]
+    return "".join(lines)
+
+
+def cold_start(repeat):
+    code = app_imports()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        best = min(best, time.perf_counter() - start)
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match:
+            top_level.append((int(match.group(1)), match.group(2)))
+    return best, sorted(top_level, reverse=True)[:8]
+
+
+def reruns(n):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(ROOT)
+    start = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    first = time.perf_counter() - start
+    if at.exception:
+        raise SystemExit(at.exception[0].value)
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+    return first, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App cold start and rerun times")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    best, slowest = cold_start(args.repeat)
+    print(f"cold start (imports)   {best*1000:8.1f} ms")
+    for micros, module in slowest:
+        print(f"    {module:<28} {micros/1000:8.1f} ms")
+
+    first, timings = reruns(args.reruns)
+    print(f"first run              {first*1000:8.1f} ms")
+    print(f"rerun median           {statistics.median(timings)*1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Benchmark suite for the search pipeline, run against a synthetic travel.db (see
+# booker.synthetic) so the numbers are repeatable and need no download:
+#
+#     python benchmarks/suite.py --save baseline.json
+#     ... make changes ...
+#     python benchmarks/suite.py --compare baseline.json
+#
+# Each stage is timed on its own - the query, pricing windows of every length from 1 to 30
+# nights (and 5 to 8 at once), VM scoring, each sort and the exports - plus a full search end to end. Timings are
+# the best of --repeat runs. With --compare, any stage more than --threshold times slower
+# than the saved run is reported and the script exits with status 1, so it can gate a CI job.
+# Pass --db to use an existing database instead of generating one. The query and search are
+# also timed against the same data converted to a Parquet dataset (booker.parquet).
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.db import open_db, query_hotels
+from booker.export import export_bytes
+from booker.parquet import ParquetStore, convert_db
+from booker.pricing import price_durations, price_stays
+from booker.search import SORT_OPTIONS, SearchParams, add_vm_score, search, sort_results
+from booker.synthetic import generate_db
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def raw_hotels(conn, city, from_, to_):
+    result_df = query_hotels(conn, city, from_, to_, 0, 5000, 6.0, 9.9, 0)
+    result_df['checkin_date'] = pd.to_datetime(result_df['checkin_date']).dt.date
+    result_df['checkout_date'] = pd.to_datetime(result_df['checkout_date']).dt.date
+    return result_df
+
+
+# (name, function) for every stage, set up on one city's search window
+def stages(conn, store, city, from_, to_, nights, export_rows):
+    raw = raw_hotels(conn, city, from_, to_)
+    stays = price_stays(raw.copy(), nights)
+    scored = add_vm_score(stays.copy())
+    ranked = search(SearchParams(city, from_, to_, nights), conn, materialized=False)
+    export = pd.concat([ranked]*(export_rows//max(len(ranked), 1) + 1)).head(export_rows)
+
+    yield "query", lambda: query_hotels(conn, city, from_, to_, 0, 5000, 6.0, 9.9, 0)
+    yield "query/parquet", lambda: query_hotels(store, city, from_, to_, 0, 5000, 6.0, 9.9, 0)
+    for length in range(1, 31):
+        yield f"pricing/{length:02d}", lambda length=length: price_stays(raw.copy(), length)
+    yield "pricing/05-08", lambda: price_durations(raw.copy(), range(5, 9))
+    yield "vm_score", lambda: add_vm_score(stays.copy())
+    for sort in SORT_OPTIONS:
+        yield f"sort/{sort}", lambda sort=sort: sort_results(scored, sort)
+    for fmt in ("Excel", "CSV", "Parquet"):
+        yield f"export/{fmt}", lambda fmt=fmt: export_bytes(export, fmt)
+    yield "search", lambda: search(SearchParams(city, from_, to_, nights), conn, materialized=False)
+    yield "search/parquet", lambda: search(SearchParams(city, from_, to_, nights), store)
+    yield "search/sql", lambda: search(SearchParams(city, from_, to_, nights), conn, engine="sql")
+    yield "search/sql top 100", lambda: search(SearchParams(city, from_, to_, nights), conn,
+                                               engine="sql", limit=100)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before and seconds > before*threshold:
+            regressions.append(f"{name}: {before*1000:.2f} ms -> {seconds*1000:.2f} ms "
+                               f"({seconds/before:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the booker search pipeline")
+    parser.add_argument("--db", help="existing database to use instead of a synthetic one")
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--hotels", type=int, default=300, help="hotels per city")
+    parser.add_argument("--days", type=int, default=190)
+    parser.add_argument("--nights", type=int, default=7, help="stay length for the other stages")
+    parser.add_argument("--export-rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="only run stages whose name starts with this")
+    parser.add_argument("--save", help="write the timings to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier --save to check against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(tmp, "travel.db")
+            start = time.perf_counter()
+            generate_db(db_path, args.cities, args.hotels, args.days, start=date(2026, 1, 5))
+            print(f"generated {args.cities} cities x {args.hotels} hotels x {args.days} days "
+                  f"in {time.perf_counter() - start:.1f} s")
+
+        convert_db(db_path, os.path.join(tmp, "parquet"))
+        store = ParquetStore(os.path.join(tmp, "parquet"))
+
+        conn = open_db(db_path)
+        city, first, last = conn.execute(
+            "SELECT city, MIN(checkin_date), MAX(checkin_date) FROM hotels "
+            "GROUP BY city ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+        from_ = date.fromisoformat(first[:10])
+        to_ = min(from_ + timedelta(days=182), date.fromisoformat(last[:10]))
+        print(f"{city}, {from_} to {to_}\n")
+
+        results = {}
+        for name, func in stages(conn, store, city, from_, to_, args.nights, args.export_rows):
+            if args.only and not name.startswith(args.only):
+                continue
+            results[name] = best_of(func, args.repeat)
+            print(f"{name:<24} {results[name]*1000:10.2f} ms")
+        conn.close()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"\nNo stage more than {args.threshold}x slower than {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
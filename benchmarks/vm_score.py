@@ -0,0 +1,74 @@
+# Check booker.search.percentile_ranks against scipy's percentileofscore (which the VM score
+# used to call) and time both. scipy compares every price with every other one, so it is only
+# timed up to --scipy-max rows; the rank-based version is timed on every size.
+#
+#     python benchmarks/vm_score.py --sizes 1000 10000 100000 1000000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.search import percentile_ranks
+
+
+# Prices like the real results: 2dp, lots of ties, plus some edge cases
+def fixtures(rng):
+    yield "single", np.array([100.0])
+    yield "all equal", np.full(50, 42.5)
+    yield "two values", np.array([10.0, 20.0]*25)
+    yield "with nan", np.array([10.0, np.nan, 30.0])
+    for n in [10, 1000, 5000]:
+        yield f"random {n}", np.round(rng.uniform(20, 400, n), 2)
+        yield f"few prices {n}", rng.choice([49.99, 65.0, 65.0, 120.5], n)
+
+
+def timed(func, values, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(values)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VM score percentile: scipy vs rank-based")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--scipy-max", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    try:
+        from scipy import stats
+    except ImportError:
+        stats = None
+        print("scipy not installed - skipping the comparison")
+
+    if stats is not None:
+        for label, values in fixtures(rng):
+            expected = np.asarray(stats.percentileofscore(values, values), dtype=float)
+            actual = percentile_ranks(values)
+            same = np.array_equal(expected, actual, equal_nan=True)
+            print(f"{label:<18} {'identical' if same else 'DIFFERENT'}")
+            if not same:
+                sys.exit(1)
+        print()
+
+    for n in args.sizes:
+        values = np.round(rng.uniform(20, 400, n), 2)
+        new = timed(percentile_ranks, values)
+        line = f"{n:>9} rows   rank-based {new*1000:10.2f} ms"
+        if stats is not None and n <= args.scipy_max:
+            old = timed(lambda v: stats.percentileofscore(v, v), values, repeat=1)
+            line += f"   scipy {old*1000:10.2f} ms   ({old/new:.0f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+from booker.pricing import price_stays
+from booker.search import SearchParams, search
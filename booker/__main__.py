@@ -0,0 +1,3 @@
+from booker.cli import main
+
+main()
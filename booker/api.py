@@ -0,0 +1,338 @@
+# JSON HTTP API for searches, for scripts and dashboards that would otherwise have to drive
+# the Streamlit page:
+#
+#     python -m booker.api --port 8000 --db travel.db
+#
+#     GET  /cities
+#     GET  /search?location=Madrid, Spain&from=2025-07-01&to=2025-08-31&nights=7&page_size=50
+#     POST /searches              {"location": ["Madrid, Spain"], "from": "2025-07-01", ...}
+#     GET  /searches/<id>         status and progress
+#     GET  /searches/<id>/results?page=2&page_size=100
+#     GET  /searches/<id>/stream  every stay as a JSON line, sent a page at a time
+#     GET  /stats                 search job and result cache counts
+#
+# Search parameters are the app's: location (repeat it, or pass a list, to compare several
+# cities), from, to, nights (7, or a range such as 5-8), min_price, max_price, min_rating,
+# max_rating, min_reviews and sort (price, rating or vm). POST /searches returns straight away
+# with the search's id; GET /search waits for it and returns the first page.
+#
+# The server runs on Tornado's asyncio event loop. Searches run as background jobs
+# (booker.jobs), so identical searches made at the same time - by any client - share one job,
+# and finished ones are answered from the job or the result cache. Every city is priced in
+# the worker processes of booker.multi, keeping the CPU-bound pricing off the event loop and
+# the GIL.
+
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import date
+
+import tornado.web
+from tornado.iostream import StreamClosedError
+
+from booker.cache import ResultCache
+from booker.cities import load_cities
+from booker.cli import SORTS, parse_holiday_length
+from booker.db import db_version
+from booker.download import DB_PATH, DB_URL, download_db
+from booker.jobs import JobQueue, search_job
+from booker.multi import city_pool
+from booker.pricing import holiday_lengths
+from booker.results import expand_results
+from booker.search import SORT_OPTIONS, SearchParams
+from booker.timing import log_to_stderr
+
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Search ids remembered (oldest are forgotten first)
+MAX_IDS = 10000
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def parse_number(value, name, kind, default):
+    if value is None:
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be a number")
+
+
+# SearchParams from a query string or JSON body (a dict of values, or lists of values).
+# location is always a tuple, so every search - even of one city - is priced in the workers.
+def search_params(args, cities):
+    def get(name, default=None):
+        value = args.get(name, default)
+        return value[0] if isinstance(value, list) and name != "location" else value
+
+    locations = args.get("location") or []
+    locations = [locations] if isinstance(locations, str) else locations
+    if not locations:
+        raise BadRequest("location is required")
+    unknown = [location for location in locations if location not in cities]
+    if unknown:
+        raise BadRequest(f"Unknown location: {', '.join(unknown)}")
+    from_ = parse_date(get("from"), "from")
+    to_ = parse_date(get("to"), "to")
+    if (to_ - from_).days < 2:
+        raise BadRequest("to must be at least 2 days after from")
+    try:
+        holiday_length = parse_holiday_length(str(get("nights", "")))
+    except argparse.ArgumentTypeError as e:
+        raise BadRequest(str(e))
+    if max(holiday_lengths(holiday_length)) > (to_ - from_).days:
+        raise BadRequest("nights must fit between from and to")
+    sort = get("sort", "price")
+    sort = SORTS.get(sort, sort)
+    if sort not in SORT_OPTIONS:
+        raise BadRequest(f"sort must be one of {', '.join(SORTS)}")
+    return SearchParams(tuple(dict.fromkeys(locations)), from_, to_, holiday_length,
+                        parse_number(get("min_price"), "min_price", float, 0),
+                        parse_number(get("max_price"), "max_price", float, 5000),
+                        parse_number(get("min_rating"), "min_rating", float, 6.0),
+                        parse_number(get("max_rating"), "max_rating", float, 9.9),
+                        parse_number(get("min_reviews"), "min_reviews", int, 0), sort)
+
+
+def search_id(params):
+    return hashlib.sha256(repr(params).encode()).hexdigest()[:16]
+
+
+def params_dict(params):
+    return dict(params._asdict(), from_=str(params.from_), to_=str(params.to_))
+
+
+# Everything the handlers share: the database, the job queue, the result cache and the worker
+# processes
+class SearchService:
+    def __init__(self, db_path, workers=None, job_workers=4, retain=30*60):
+        self.db_path = db_path
+        self.cities = load_cities()
+        self.city_set = set(self.cities)
+        self.cache = ResultCache()
+        self.jobs = JobQueue(workers=job_workers, retain=retain)
+        self.city_executor = city_pool(db_path, workers)
+        self.searches = OrderedDict()
+
+    def key(self, params):
+        return (params, db_version(self.db_path))
+
+    # Start the search (or join the identical one already running) and return its id
+    def submit(self, params):
+        key = self.key(params)
+        if self.cache.get(params, key[1]) is None:
+            self.jobs.submit(key, search_job, params, None, self.db_path, self.city_executor,
+                             self.cache, key[1])
+        id = search_id(params)
+        self.searches[id] = params
+        self.searches.move_to_end(id)
+        while len(self.searches) > MAX_IDS:
+            self.searches.popitem(last=False)
+        return id
+
+    def params(self, id):
+        params = self.searches.get(id)
+        if params is None:
+            raise tornado.web.HTTPError(404, reason="Unknown search")
+        return params
+
+    # Compact results of a finished search, None while it is running. Raises 404 if it has
+    # been forgotten, and 500 if it failed.
+    def results(self, params):
+        key = self.key(params)
+        job = self.jobs.get(key)
+        if job is not None and job.status == "failed":
+            raise tornado.web.HTTPError(500, reason=job.error)
+        if job is not None and job.status == "done":
+            return job.result
+        cached = self.cache.get(params, key[1])
+        if cached is None and job is None:
+            raise tornado.web.HTTPError(404, reason="Search has expired, submit it again")
+        return cached
+
+    # Wait without blocking the event loop
+    async def wait(self, params):
+        job = self.jobs.get(self.key(params))
+        if job is not None:
+            await asyncio.wrap_future(job.future)
+        return self.results(params)
+
+    def status(self, id):
+        params = self.params(id)
+        job = self.jobs.get(self.key(params))
+        status = {"id": id, "params": params_dict(params)}
+        if job is None:
+            self.results(params)
+            return dict(status, status="done")
+        return dict(status, status=job.status, done=job.done, total=job.total,
+                    message=job.message, error=job.error)
+
+    def shutdown(self):
+        self.jobs.shutdown(wait=False)
+        self.city_executor.shutdown(cancel_futures=True)
+
+
+def page_of(results, page, page_size):
+    total = len(results)
+    pages = max(1, -(-total//page_size))
+    start = (page - 1)*page_size
+    rows = expand_results(results.iloc[start:start + page_size])
+    return {"page": page, "page_size": page_size, "pages": pages, "total": total,
+            "results": rows.to_dict(orient="records")}
+
+
+class Handler(tornado.web.RequestHandler):
+    @property
+    def service(self):
+        return self.application.settings["service"]
+
+    def query_args(self):
+        return {name: [value.decode() for value in values]
+                for name, values in self.request.query_arguments.items()}
+
+    def paging(self):
+        page = self.get_argument("page", "1")
+        page_size = self.get_argument("page_size", str(PAGE_SIZE))
+        if not (page.isdigit() and page_size.isdigit() and int(page) >= 1
+                and 1 <= int(page_size) <= MAX_PAGE_SIZE):
+            raise tornado.web.HTTPError(400, reason=f"page must be 1 or more and page_size 1 to {MAX_PAGE_SIZE}")
+        return int(page), int(page_size)
+
+    def params(self, args):
+        try:
+            return search_params(args, self.service.city_set)
+        except BadRequest as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+
+    def write_error(self, status_code, **kwargs):
+        self.finish({"error": self._reason, "status": status_code})
+
+
+class CitiesHandler(Handler):
+    def get(self):
+        self.write({"cities": list(self.service.cities)})
+
+
+class StatsHandler(Handler):
+    def get(self):
+        self.write({"jobs": self.service.jobs.stats(), "cache": self.service.cache.stats()})
+
+
+# Search and wait for the first page (or the page asked for)
+class SearchHandler(Handler):
+    async def get(self):
+        params = self.params(self.query_args())
+        page, page_size = self.paging()
+        id = self.service.submit(params)
+        results = await self.service.wait(params)
+        self.write(dict(page_of(results, page, page_size), id=id))
+
+
+class SearchesHandler(Handler):
+    def post(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, reason="Body must be a JSON object")
+        id = self.service.submit(self.params(body))
+        self.set_status(202)
+        self.write(self.service.status(id))
+
+
+class StatusHandler(Handler):
+    def get(self, id):
+        self.write(self.service.status(id))
+
+
+# A page of results, waiting for the search to finish unless wait=0
+class ResultsHandler(Handler):
+    async def get(self, id):
+        params = self.service.params(id)
+        page, page_size = self.paging()
+        if self.get_argument("wait", "1") == "0":
+            results = self.service.results(params)
+            if results is None:
+                self.set_status(202)
+                self.write(self.service.status(id))
+                return
+        else:
+            results = await self.service.wait(params)
+        self.write(dict(page_of(results, page, page_size), id=id))
+
+
+# Every stay as newline-delimited JSON, flushed to the client a page at a time so large
+# result sets are never built into one response in memory. A client that goes away part way
+# through just stops the stream.
+class StreamHandler(Handler):
+    async def get(self, id):
+        params = self.service.params(id)
+        _, page_size = self.paging()
+        results = await self.service.wait(params)
+        self.set_header("Content-Type", "application/x-ndjson")
+        try:
+            for start in range(0, len(results), page_size):
+                rows = expand_results(results.iloc[start:start + page_size])
+                self.write("".join(json.dumps(row) + "\n" for row in rows.to_dict(orient="records")))
+                await self.flush()
+        except StreamClosedError:
+            return
+
+
+def make_app(service):
+    return tornado.web.Application([
+        (r"/cities", CitiesHandler),
+        (r"/search", SearchHandler),
+        (r"/searches", SearchesHandler),
+        (r"/searches/(\w+)", StatusHandler),
+        (r"/searches/(\w+)/results", ResultsHandler),
+        (r"/searches/(\w+)/stream", StreamHandler),
+        (r"/stats", StatsHandler),
+    ], service=service)
+
+
+async def serve(service, host, port):
+    server = make_app(service).listen(port, address=host)
+    print(f"Listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m booker.api", description="JSON search API")
+    parser.add_argument("--db", help="use this travel.db (or Parquet dataset) instead of downloading the release")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="pricing processes (default: one per CPU)")
+    parser.add_argument("--jobs", type=int, default=4, help="searches run at once")
+    parser.add_argument("--timings", action="store_true", help="log each search's timings to stderr")
+    args = parser.parse_args(argv)
+
+    if args.timings:
+        log_to_stderr()
+    service = SearchService(args.db or download_db(DB_URL, DB_PATH), args.workers, args.jobs)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# In-memory LRU cache for search results shared by every session.
+#
+# Entries expire after ttl seconds, and the least recently used entries are evicted once
+# there are more than maxsize of them or their dataframes use more than max_bytes. Every
+# entry belongs to a database version (see booker.db.db_version) and the whole cache is
+# dropped as soon as a lookup is made against a different version, so results from a
+# replaced travel.db are never served.
+#
+# Cached values are shared between callers, so they must not be modified in place.
+class ResultCache:
+    def __init__(self, maxsize=64, ttl=30*60, max_bytes=512*1024*1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def _pop(self, key):
+        expires, value, size = self._entries.pop(key)
+        self._bytes -= size
+        return value
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, version=None):
+        size = int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else 0
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._pop(key)
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (self.clock() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    # Cached value for key, or the result of compute() which is then cached
+    def get_or_compute(self, key, compute, version=None):
+        value = self.get(key, version)
+        if value is None:
+            value = self.put(key, compute(), version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
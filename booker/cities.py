@@ -0,0 +1,16 @@
+import csv
+
+
+CITIES_CSV = "citynames.csv"
+
+# Cities containing any of these are not offered
+EXCLUDE = ('Andorra', 'San Marino', 'Monaco', 'Jersey', 'Guernsey', 'Isle of Man',
+           'Liechtenstein', 'Sector 3', 'Syria', 'Luxembourg', 'Cyprus')
+
+
+# Sorted tuple of the city names that can be searched, read with the csv module in one pass
+# (no pandas needed)
+def load_cities(path=CITIES_CSV, exclude=EXCLUDE):
+    with open(path, newline='', encoding='utf-8') as f:
+        names = [row['Full Name'] for row in csv.DictReader(f)]
+    return tuple(sorted(name for name in names if not any(item in name for item in exclude)))
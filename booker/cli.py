@@ -0,0 +1,145 @@
+# Command line entry point for running searches without the Streamlit app:
+#
+#     python -m booker search --city "Madrid, Spain" --from 2025-07-01 --to 2025-08-31 --nights 7
+#     python -m booker search --city "Madrid, Spain" ... --output results.parquet
+#     python -m booker search --city "Madrid, Spain" --city "Lisbon, Portugal" ... --workers 4
+#     python -m booker search --city "Madrid, Spain" ... --engine sql --limit 100
+#     python -m booker search --city "Madrid, Spain" ... --best-per-hotel
+#     python -m booker search --city "Madrid, Spain" --from 2025-07-01 --to 2025-08-31 --nights 5-8
+#     python -m booker search --city "Madrid, Spain" ... --timings 2> timings.jsonl
+#     python -m booker build-stays travel.db --nights 1-30
+
+import argparse
+import sys
+from datetime import date
+
+from booker import materialize
+from booker.download import DB_PATH, DB_URL, download_db
+from booker.export import write_export
+from booker.multi import search_cities
+from booker.parquet import open_source
+from booker.search import ENGINES, SearchParams, best_stay_per_hotel, search
+from booker.timing import SearchTimings, log_to_stderr
+
+
+# --format: export format in booker.export (JSON is written by pandas directly)
+FORMATS = {"csv": "CSV", "json": None, "parquet": "Parquet", "xlsx": "Excel"}
+SORTS = {"price": "Price", "rating": "Rating", "vm": "Price & Rating"}
+
+
+def write_results(df, output, fmt):
+    if fmt is None:
+        fmt = output.rsplit(".", 1)[-1].lower() if output and "." in output else "csv"
+    if fmt not in FORMATS:
+        raise SystemExit(f"Unknown output format: {fmt}")
+
+    if fmt == "json":
+        df.to_json(output or sys.stdout, orient="records", date_format="iso")
+    elif output:
+        with open(output, "wb") as f:
+            write_export(df, f, FORMATS[fmt])
+    elif fmt == "csv":
+        write_export(df, sys.stdout.buffer, FORMATS[fmt])
+    else:
+        raise SystemExit(f"{fmt} output needs --output")
+
+
+# "7", or a range of lengths to search at once such as "5-8"
+def parse_holiday_length(value):
+    shortest, _, longest = value.partition('-')
+    try:
+        shortest, longest = int(shortest), int(longest or shortest)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid holiday length: {value}")
+    if not 1 <= shortest <= longest <= 30:
+        raise argparse.ArgumentTypeError("nights must be between 1 and 30")
+    return shortest if shortest == longest else (shortest, longest)
+
+
+def add_search_arguments(parser):
+    parser.add_argument("--city", required=True, action="append", dest="cities",
+                        help='eg. "Madrid, Spain" (repeat to search several cities)')
+    parser.add_argument("--from", dest="from_", required=True, type=date.fromisoformat)
+    parser.add_argument("--to", dest="to_", required=True, type=date.fromisoformat)
+    parser.add_argument("--nights", required=True, type=parse_holiday_length, metavar="1-30",
+                        help="holiday length, or a range such as 5-8 to compare several at once")
+    parser.add_argument("--min-price", type=float, default=0)
+    parser.add_argument("--max-price", type=float, default=5000)
+    parser.add_argument("--min-rating", type=float, default=6.0)
+    parser.add_argument("--max-rating", type=float, default=9.9)
+    parser.add_argument("--min-reviews", type=int, default=0)
+    parser.add_argument("--sort", choices=SORTS, default="price")
+
+
+def search_params(args):
+    return SearchParams(args.cities[0], args.from_, args.to_, args.nights, args.min_price,
+                        args.max_price, args.min_rating, args.max_rating, args.min_reviews,
+                        SORTS[args.sort])
+
+
+def run_search(args):
+    if args.db:
+        db_path = args.db
+    else:
+        db_path = download_db(DB_URL, DB_PATH)
+
+    if args.timings:
+        log_to_stderr()
+
+    params = search_params(args)
+    location = tuple(args.cities) if len(args.cities) > 1 else params.location
+    # The best stay of each hotel has to be picked before the rest are cut off
+    limit = None if args.best_per_hotel else args.limit
+    with SearchTimings(**params._replace(location=location)._asdict(), engine=args.engine) as timings:
+        if len(args.cities) > 1 and args.engine == "pandas":
+            df = search_cities(params, args.cities, db_path, args.workers,
+                               materialized=not args.live, timings=timings, limit=limit)
+        else:
+            # The sql engine ranks several cities together in one query
+            conn = open_source(db_path)
+            try:
+                df = search(params._replace(location=location), conn, materialized=not args.live,
+                            timings=timings, engine=args.engine, limit=limit)
+            finally:
+                conn.close()
+        if args.best_per_hotel:
+            df = best_stay_per_hotel(df).head(args.limit)
+        with timings.stage("export", rows=len(df)):
+            write_results(df, args.output, args.format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m booker")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser("search", help="search for the best hotels in a window")
+    add_search_arguments(search_parser)
+    search_parser.add_argument("--db", help="use this travel.db, or a Parquet dataset directory or URL "
+                                                 "(see booker.parquet), instead of downloading the release")
+    search_parser.add_argument("--live", action="store_true",
+                               help="always price stays live, ignoring the hotel_stays table")
+    search_parser.add_argument("--workers", type=int,
+                               help="processes for a multi-city search (default: one per CPU)")
+    search_parser.add_argument("--output", "-o", help="output file (default: stdout)")
+    search_parser.add_argument("--format", choices=FORMATS,
+                               help="output format (default: from the --output extension, else csv)")
+    search_parser.add_argument("--engine", choices=ENGINES, default="pandas",
+                               help="price stays in pandas (default) or inside SQLite")
+    search_parser.add_argument("--limit", type=int, help="only output the top N stays")
+    search_parser.add_argument("--best-per-hotel", action="store_true",
+                               help="only output the best stay of each hotel")
+    search_parser.add_argument("--timings", action="store_true",
+                               help="log per-stage timings to stderr as a JSON line")
+    search_parser.set_defaults(run=run_search)
+
+    build_parser = commands.add_parser("build-stays", help="precompute the hotel_stays table")
+    build_parser.add_argument("db", help="path to travel.db")
+    build_parser.add_argument("--nights", type=materialize.parse_nights, default=list(range(1, 31)))
+    build_parser.add_argument("--city", action="append", dest="cities")
+    build_parser.set_defaults(run=lambda args: materialize.build_stays(args.db, args.nights, args.cities,
+                                                                                  materialize.print_progress))
+
+    args = parser.parse_args(argv)
+    if args.command == "search" and args.engine == "sql" and isinstance(args.nights, tuple):
+        search_parser.error("--engine sql searches one holiday length at a time, not a range of --nights")
+    args.run(args)
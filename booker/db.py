@@ -0,0 +1,207 @@
+import atexit
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+import pandas as pd
+
+
+# Columns the pricing step and the results table need, in the order they are displayed
+HOTEL_COLUMNS = ['city', 'name', 'checkin_date', 'checkout_date', 'approx_price',
+                 'rating', 'reviews', 'hotel_link']
+
+# Searches always filter on city and a check-in range, then order by hotel name. The
+# price/rating/reviews filters are answered from the index too, so SQLite only visits the
+# table rows for hotels that pass every filter.
+HOTELS_INDEX = "idx_hotels_city_checkin_name"
+HOTELS_INDEX_SQL = f"""CREATE INDEX IF NOT EXISTS {HOTELS_INDEX}
+                       ON hotels (city, checkin_date, name, approx_price, rating, reviews)"""
+
+HOTELS_QUERY = f"""SELECT {', '.join(HOTEL_COLUMNS)}
+                   FROM hotels
+                   WHERE city = ?
+                   AND checkin_date >= ?
+                   AND checkin_date <= ?
+                   AND approx_price BETWEEN ? AND ?
+                   AND rating >= ?
+                   AND rating <= ?
+                   AND reviews >= ?
+
+                   ORDER BY name, checkin_date
+                   """
+
+
+# Big enough to map the whole file (hotels plus the hotel_stays table), so pages are read
+# straight from the OS page cache, which every connection and process shares, rather than
+# copied into each connection's own cache
+MMAP_SIZE = 1024*1024*1024
+CACHE_SIZE = -64*1024
+
+
+# Create the search index if the database doesn't have it yet, and gather the planner
+# statistics (ANALYZE) so SQLite knows how selective each index is. This writes to the file,
+# so it should run once after the database is downloaded and before it is shared - read-only
+# connections can't update the statistics later.
+def ensure_indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(HOTELS_INDEX_SQL)
+            conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+
+# Read-only connection to the downloaded database. immutable=1 lets SQLite skip locking and
+# change detection entirely - the file is only ever replaced by a fresh download, never
+# modified in place. Sorts and temporary b-trees are kept in memory (temp_store) rather than
+# in temporary files. shared_cache=True shares one page cache between the connections of a
+# process, at the cost of them taking turns on it (see benchmarks/concurrency.py).
+def open_db(db_path, mmap_size=MMAP_SIZE, cache_size=CACHE_SIZE, check_same_thread=True,
+            shared_cache=False):
+    uri = "file:{0}?mode=ro&immutable=1".format(quote(os.path.abspath(db_path)))
+    if shared_cache:
+        uri += "&cache=shared"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+# Read-only connections to the downloaded database, one per thread. Streamlit runs every
+# rerun on its own thread, so connections belonging to threads that have finished are
+# closed whenever a new one is opened, and everything is closed when the process exits.
+#
+# Each connection remembers the db_version it was opened at. A connection stays on the file
+# it opened even after a new release is renamed over db_path, so a thread's connection is
+# closed and reopened as soon as the version changes - otherwise long-lived threads (the
+# search jobs) would go on searching the old release.
+class ConnectionPool:
+    def __init__(self, db_path, mmap_size=MMAP_SIZE, cache_size=CACHE_SIZE, shared_cache=False):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.shared_cache = shared_cache
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _connect(self):
+        return open_db(self.db_path, self.mmap_size, self.cache_size, check_same_thread=False,
+                       shared_cache=self.shared_cache)
+
+    # Connection for the calling thread, opened on first use
+    def connection(self):
+        thread = threading.current_thread()
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            version = db_version(self.db_path)
+            conn, opened = self._connections.get(thread, (None, None))
+            if conn is not None and opened != version:
+                del self._connections[thread]
+                conn.close()
+                conn = None
+            if conn is None:
+                for other in [t for t in self._connections if not t.is_alive()]:
+                    self._connections.pop(other)[0].close()
+                conn = self._connect()
+                self._connections[thread] = (conn, version)
+        return conn
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        atexit.unregister(self.close)
+
+
+# Identifies the database file currently at db_path. The download replaces travel.db with a
+# rename, so a new release always gets a new inode and modification time.
+# A Parquet dataset (booker.parquet) is identified by its manifest, which is rewritten last -
+# for one on a web server, by the version in the manifest (read again every few minutes).
+def db_version(db_path):
+    if db_path.startswith(("http://", "https://")):
+        # Imported here as booker.parquet imports this module
+        from booker.parquet import remote_manifest
+
+        return (db_path, remote_manifest(db_path)["version"])
+    if os.path.isdir(db_path):
+        db_path = os.path.join(db_path, "manifest.json")
+    stat = os.stat(db_path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+# Dates are bound as ISO strings to compare the same way as the stored TEXT dates
+def hotels_query_params(location, from_, to_, min_price, max_price, min_review_score,
+                        max_review_score, min_reviews):
+    return (location, str(from_), str(to_), min_price, max_price, min_review_score,
+            max_review_score, min_reviews)
+
+
+# Read the raw 7 night results for a search into a dataframe. conn can also be a
+# booker.parquet.ParquetStore, which answers the same queries from a Parquet dataset.
+def query_hotels(conn, location, from_, to_, min_price, max_price, min_review_score,
+                 max_review_score, min_reviews):
+    if not isinstance(conn, sqlite3.Connection):
+        return conn.query_hotels(location, from_, to_, min_price, max_price, min_review_score,
+                                 max_review_score, min_reviews)
+    params = hotels_query_params(location, from_, to_, min_price, max_price,
+                                 min_review_score, max_review_score, min_reviews)
+    return pd.read_sql(HOTELS_QUERY, con=conn, params=params)
+
+
+# Same as query_hotels, but read in batches of whole hotels - rows are fetched chunksize at a
+# time and each batch ends at the last hotel boundary, so only one batch plus one hotel's
+# rows are held at once. The index carries on across batches as if it were one dataframe.
+def iter_hotels(conn, location, from_, to_, min_price, max_price, min_review_score,
+                max_review_score, min_reviews, chunksize=5000):
+    if not isinstance(conn, sqlite3.Connection):
+        yield from conn.iter_hotels(location, from_, to_, min_price, max_price, min_review_score,
+                                    max_review_score, min_reviews, chunksize=chunksize)
+        return
+    params = hotels_query_params(location, from_, to_, min_price, max_price,
+                                 min_review_score, max_review_score, min_reviews)
+    cursor = conn.execute(HOTELS_QUERY, params)
+    columns = [column[0] for column in cursor.description]
+    name = columns.index('name')
+
+    def batch(rows, offset):
+        return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True,
+                                         index=pd.RangeIndex(offset, offset + len(rows)))
+
+    try:
+        buffered = []
+        offset = 0
+        while rows := cursor.fetchmany(chunksize):
+            buffered.extend(rows)
+            split = len(buffered)
+            while split > 0 and buffered[split - 1][name] == buffered[-1][name]:
+                split -= 1
+            if split:
+                yield batch(buffered[:split], offset)
+                offset += split
+                buffered = buffered[split:]
+        if buffered:
+            yield batch(buffered, offset)
+    finally:
+        cursor.close()
+
+
+def count_hotels(conn, location, from_, to_, min_price, max_price, min_review_score,
+                 max_review_score, min_reviews):
+    if not isinstance(conn, sqlite3.Connection):
+        return conn.count_hotels(location, from_, to_, min_price, max_price, min_review_score,
+                                 max_review_score, min_reviews)
+    params = hotels_query_params(location, from_, to_, min_price, max_price,
+                                 min_review_score, max_review_score, min_reviews)
+    query = HOTELS_QUERY.replace(f"SELECT {', '.join(HOTEL_COLUMNS)}", "SELECT COUNT(DISTINCT name)")
+    query = query[:query.index("ORDER BY")]
+    return conn.execute(query, params).fetchone()[0]
+
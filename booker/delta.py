@@ -0,0 +1,337 @@
+# Delta updates for travel.db, so a new release only transfers (and writes) the hotels rows
+# that changed rather than the whole database:
+#
+#     python -m booker.delta publish releases/ new.db --version v1.0.3
+#     python -m booker.delta update https://example.com/releases/manifest.json travel.db
+#
+# publish keeps every released database under releases/<version>/travel.db, and for each
+# version after the first writes its delta from the one before: for every city/month chunk
+# that changed, the rows removed and the rows inserted (a changed row is both), as a gzipped
+# JSON file. manifest.json lists them all (paths are relative to the manifest):
+#
+#     {"latest": "v1.0.3",
+#      "versions": {"v1.0.2": {"db": "v1.0.2/travel.db", "sha256": ..., "size": ...},
+#                   "v1.0.3": {"db": ..., "sha256": ..., "size": ...,
+#                              "delta": {"from": "v1.0.2", "chunks": [
+#                                  {"city": ..., "month": "2026-11", "path": "v1.0.3/delta/0000.json.gz",
+#                                   "sha256": <of the file>, "before": <rows digest>,
+#                                   "after": <rows digest>, "removed": 12, "inserted": 15}]}}}}
+#
+# update_db follows the deltas from the local version to the latest. They are applied to a
+# copy of travel.db (travel.db.part), each version in one transaction that checks every
+# chunk's rows against its digests before and after, and the copy is then renamed over
+# travel.db - so, as with a full download, the (immutable, read-only) search connections
+# never see the file change under them, and reopen on the new one (see
+# booker.db.ConnectionPool). A database that doesn't match a delta is left untouched and
+# replaced with a full download instead. If the release server can't be reached, the
+# installed copy is kept. update_db says which (city, month) chunks of hotels rows it changed,
+# so what was worked out from the others (see booker.watchlist) needn't be checked again.
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from collections import Counter, namedtuple
+from urllib.parse import urljoin
+
+from booker import materialize
+from booker.db import HOTEL_COLUMNS
+from booker.download import (DownloadLock, HEADERS, download_db, file_sha256, read_meta,
+                             write_atomic)
+
+
+MANIFEST = "manifest.json"
+
+CHUNK_QUERY = f"""SELECT {', '.join(HOTEL_COLUMNS)}
+                  FROM hotels
+                  WHERE city = ?
+                  AND substr(checkin_date, 1, 7) = ?"""
+
+# Removes one copy of a row (the table has no key, and may hold duplicates)
+DELETE_ROW = f"""DELETE FROM hotels WHERE rowid = (
+                     SELECT rowid FROM hotels
+                     WHERE {' AND '.join(f'{column} IS ?' for column in HOTEL_COLUMNS)}
+                     LIMIT 1)"""
+
+INSERT_ROW = f"INSERT INTO hotels ({', '.join(HOTEL_COLUMNS)}) VALUES ({', '.join('?'*len(HOTEL_COLUMNS))})"
+
+
+class DeltaError(Exception):
+    pass
+
+
+# Checksum of a chunk's rows that doesn't depend on their order in the table
+def rows_digest(rows):
+    digest = hashlib.sha256()
+    for line in sorted(json.dumps(list(row)) for row in rows):
+        digest.update(line.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+# {month: rows} for one city
+def city_chunks(conn, city):
+    chunks = {}
+    for row in conn.execute(f"SELECT {', '.join(HOTEL_COLUMNS)} FROM hotels WHERE city = ?", (city,)):
+        chunks.setdefault(row[2][:7], []).append(row)
+    return chunks
+
+
+# Rows to remove and to insert to turn old into new, keeping duplicates
+def diff_rows(old, new):
+    old, new = Counter(old), Counter(new)
+    return list((old - new).elements()), list((new - old).elements())
+
+
+# Delta chunks from old_db to new_db, written as out_dir/prefix/NNNN.json.gz
+def make_delta(old_db, new_db, out_dir, prefix):
+    old, new = sqlite3.connect(old_db), sqlite3.connect(new_db)
+    chunks = []
+    try:
+        cities = sorted({row[0] for conn in (old, new) for row in conn.execute("SELECT DISTINCT city FROM hotels")})
+        for city in cities:
+            old_chunks, new_chunks = city_chunks(old, city), city_chunks(new, city)
+            for month in sorted(set(old_chunks) | set(new_chunks)):
+                before, after = old_chunks.get(month, []), new_chunks.get(month, [])
+                removed, inserted = diff_rows(before, after)
+                if not removed and not inserted:
+                    continue
+                path = f"{prefix}/{len(chunks):04d}.json.gz"
+                data = gzip.compress(json.dumps({"city": city, "month": month, "removed": removed,
+                                                 "inserted": inserted}).encode(), mtime=0)
+                os.makedirs(os.path.dirname(os.path.join(out_dir, path)), exist_ok=True)
+                with open(os.path.join(out_dir, path), "wb") as f:
+                    f.write(data)
+                chunks.append({"city": city, "month": month, "path": path,
+                               "sha256": hashlib.sha256(data).hexdigest(),
+                               "before": rows_digest(before), "after": rows_digest(after),
+                               "removed": len(removed), "inserted": len(inserted)})
+    finally:
+        old.close()
+        new.close()
+    return chunks
+
+
+# Add db_path to the releases in out_dir as version, with a delta from the latest one
+def publish(out_dir, db_path, version):
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = read_meta(manifest_path) or {"latest": None, "versions": {}}
+    if version in manifest["versions"]:
+        raise DeltaError(f"{version} has already been published")
+
+    db = f"{version}/travel.db"
+    os.makedirs(os.path.join(out_dir, version), exist_ok=True)
+    shutil.copyfile(db_path, os.path.join(out_dir, db))
+    entry = {"db": db, "sha256": file_sha256(db_path), "size": os.path.getsize(db_path)}
+    previous = manifest["latest"]
+    if previous is not None:
+        chunks = make_delta(os.path.join(out_dir, manifest["versions"][previous]["db"]), db_path,
+                            out_dir, f"{version}/delta")
+        entry["delta"] = {"from": previous, "chunks": chunks}
+
+    manifest["versions"][version] = entry
+    manifest["latest"] = version
+    write_atomic(manifest_path, json.dumps(manifest, indent=1))
+    return entry
+
+
+# What update_db did: the release version the local copy was at before (None if it wasn't a
+# known one) and is at now, and the (city, month) chunks of hotels rows that changed between
+# them - None after a full download, which could have changed any of them
+Update = namedtuple('Update', ['path', 'old_version', 'version', 'changed'])
+
+
+# Versions to apply, in order, to get from version to latest by deltas - None if there's no
+# unbroken chain of them
+def delta_chain(manifest, version, latest):
+    chain = []
+    while latest != version:
+        delta = manifest["versions"][latest].get("delta")
+        if delta is None:
+            return None
+        chain.append(latest)
+        latest = delta["from"]
+    return chain[::-1]
+
+
+# Release version recorded for the local copy. The file itself isn't checked - building stays
+# or indexes changes it without changing the hotels rows, and apply_delta checks the rows of
+# every chunk it touches anyway. Without a manifest, whatever was recorded when the copy was
+# installed (its version, or the checksum of its download).
+def local_version(path, meta, manifest=None):
+    if not meta or not os.path.exists(path):
+        return None
+    if manifest is None:
+        return meta.get("version") or meta.get("remote_sha256")
+    if meta.get("version") in manifest["versions"]:
+        return meta["version"]
+    for version, entry in manifest["versions"].items():
+        if entry["sha256"] == meta.get("remote_sha256"):
+            return version
+    return None
+
+
+def fetch(url, timeout):
+    import requests
+
+    response = requests.get(url, headers=HEADERS, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+# Download and check every chunk of a version's delta, as (entry, data) pairs
+def fetch_delta(manifest_url, delta, timeout):
+    chunks = []
+    for entry in delta["chunks"]:
+        data = fetch(urljoin(manifest_url, entry["path"]), timeout)
+        if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise DeltaError(f"Delta chunk {entry['path']} is corrupt")
+        chunks.append((entry, json.loads(gzip.decompress(data))))
+    return chunks
+
+
+# Apply a version's delta chunks to the hotels table in one transaction. Built stays of the
+# cities it touches (see booker.materialize) are dropped in the same transaction, so they are
+# never stale, and {city: nights built} is returned for them to be rebuilt.
+def apply_delta(db_path, chunks):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cities = sorted({entry["city"] for entry, _ in chunks})
+    rebuild = {}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for entry, data in chunks:
+                key = (entry["city"], entry["month"])
+                if rows_digest(conn.execute(CHUNK_QUERY, key)) != entry["before"]:
+                    raise DeltaError(f"{entry['city']} {entry['month']} doesn't match the delta's base")
+                for row in data["removed"]:
+                    conn.execute(DELETE_ROW, row)
+                conn.executemany(INSERT_ROW, data["inserted"])
+                if rows_digest(conn.execute(CHUNK_QUERY, key)) != entry["after"]:
+                    raise DeltaError(f"{entry['city']} {entry['month']} is wrong after the delta")
+
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'hotel_stays_nights'").fetchone():
+                for city in cities:
+                    nights = [row[0] for row in conn.execute(
+                        "SELECT nights FROM hotel_stays_nights WHERE city = ?", (city,))]
+                    if nights:
+                        rebuild[city] = nights
+                    conn.execute("DELETE FROM hotel_stays WHERE city = ?", (city,))
+                    conn.execute("DELETE FROM hotel_stays_nights WHERE city = ?", (city,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        # The indexes were kept up to date by the changes, refresh their statistics
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return rebuild
+
+
+# Apply the deltas (one list of fetched chunks per version, in order) to a copy of the
+# database at path + ".part", rebuild the built stays they dropped, and rename the copy over
+# path
+def apply_deltas(path, deltas):
+    part_path = path + ".part"
+    # The copy isn't a download for download_db to resume
+    if os.path.exists(part_path + ".json"):
+        os.remove(part_path + ".json")
+    shutil.copyfile(path, part_path)
+    try:
+        rebuild = {}
+        for chunks in deltas:
+            for city, nights in apply_delta(part_path, chunks).items():
+                rebuild[city] = sorted(set(rebuild.get(city, [])) | set(nights))
+        for city, nights in rebuild.items():
+            materialize.build_stays(part_path, nights, [city])
+    except BaseException:
+        os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+
+
+# Bring the travel.db at path up to the latest version in the manifest at manifest_url,
+# applying deltas where there's a chain of them from the local version and downloading the
+# latest database in full otherwise (or if a delta doesn't apply). The version is recorded
+# in the download metadata next to the database. If the manifest or a delta can't be
+# fetched, an installed copy is kept as it is. Returns an Update.
+def update_db(manifest_url, path, timeout=60):
+    import requests
+
+    meta_path = path + ".json"
+    try:
+        manifest = json.loads(fetch(manifest_url, timeout))
+    except requests.RequestException:
+        version = local_version(path, read_meta(meta_path))
+        if version is not None:
+            return Update(path, version, version, set())
+        raise
+    latest = manifest["latest"]
+
+    with DownloadLock(path):
+        meta = read_meta(meta_path)
+        version = local_version(path, meta, manifest)
+        if version == latest:
+            return Update(path, version, version, set())
+        chain = delta_chain(manifest, version, latest) if version else None
+        if chain is not None:
+            try:
+                deltas = [fetch_delta(manifest_url, manifest["versions"][step]["delta"], timeout)
+                          for step in chain]
+                apply_deltas(path, deltas)
+            except requests.RequestException:
+                return Update(path, version, version, set())
+            except DeltaError:
+                chain = None
+            else:
+                meta.update(version=latest, size=os.path.getsize(path), sha256=file_sha256(path))
+                write_atomic(meta_path, json.dumps(meta))
+                changed = {(entry["city"], entry["month"]) for chunks in deltas for entry, _ in chunks}
+                return Update(path, version, latest, changed)
+
+    # download_db takes the lock itself
+    entry = manifest["versions"][latest]
+    download_db(urljoin(manifest_url, entry["db"]), path, sha256=entry["sha256"], timeout=timeout)
+    meta = read_meta(meta_path)
+    meta["version"] = latest
+    write_atomic(meta_path, json.dumps(meta))
+    return Update(path, version, latest, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m booker.delta",
+                                     description="Publish and apply travel.db delta updates")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = commands.add_parser("publish", help="add a database to a releases directory")
+    publish_parser.add_argument("out", help="releases directory (manifest.json is kept here)")
+    publish_parser.add_argument("db", help="the new travel.db")
+    publish_parser.add_argument("--version", required=True)
+
+    update_parser = commands.add_parser("update", help="update a local travel.db to the latest release")
+    update_parser.add_argument("manifest", help="URL of the releases manifest.json")
+    update_parser.add_argument("db", help="local travel.db")
+
+    args = parser.parse_args(argv)
+    if args.command == "publish":
+        entry = publish(args.out, args.db, args.version)
+        chunks = entry.get("delta", {}).get("chunks", [])
+        print(f"{args.version}: {len(chunks)} changed chunks, "
+              f"{sum(chunk['removed'] for chunk in chunks)} rows removed, "
+              f"{sum(chunk['inserted'] for chunk in chunks)} inserted")
+    else:
+        update = update_db(args.manifest, args.db)
+        if update.version == update.old_version:
+            print(f"{update.version} is the latest")
+        elif update.changed is None:
+            print(f"Downloaded {update.version}")
+        else:
+            print(f"Updated {update.old_version} to {update.version}, {len(update.changed)} changed chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+
+from booker.db import ensure_indexes
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to no cross-process locking
+    fcntl = None
+
+
+DB_URL = "https://github.com/jake-ockerby/Booking-Tool/releases/download/v1.0.2/travel.db"
+DB_PATH = "travel.db"
+
+CHUNK_SIZE = 1024*1024
+HEADERS = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_meta(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Write-then-rename so a reader never sees a half-written file
+def write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# True if the local database is exactly the one recorded when it was installed
+def local_copy_ok(path, meta, url):
+    if not meta or meta.get("url") != url or not os.path.exists(path):
+        return False
+    if os.path.getsize(path) != meta.get("size"):
+        return False
+    return file_sha256(path) == meta.get("sha256")
+
+
+class DownloadLock:
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+# Download the release database to path, reusing what is already on disk where possible:
+#
+# - A local copy whose size and SHA-256 match what was recorded at install time is kept if
+#   the server says it is unchanged (ETag / Last-Modified revalidation, 304), or if the
+#   server can't be reached.
+# - A partial download left by an earlier run is resumed with an HTTP Range request, as long
+#   as the remote file still has the same ETag. One that's already as long as the remote file
+#   (the last run stopped after the body was written, eg. while indexing it) is discarded and
+#   downloaded again from the start.
+# - The file is downloaded to path + ".part", checked against the Content-Length and (if
+#   given) the expected SHA-256, indexed, and only then renamed over path.
+#
+# Workers in the same container take a file lock so only one of them downloads.
+def download_db(url, path, sha256=None, chunk_size=CHUNK_SIZE, timeout=60):
+    # Imported here so starting the app doesn't pay for requests until a search is made
+    import requests
+
+    meta_path = path + ".json"
+    part_path = path + ".part"
+    part_meta_path = part_path + ".json"
+
+    with DownloadLock(path):
+        meta = read_meta(meta_path)
+        have_local = local_copy_ok(path, meta, url)
+        if have_local and sha256 and meta.get("remote_sha256") != sha256:
+            have_local = False
+
+        headers = dict(HEADERS)
+        if have_local:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        # Resume a partial download of the same remote file
+        part_meta = read_meta(part_meta_path)
+        offset = 0
+        if (not have_local and part_meta and part_meta.get("url") == url and part_meta.get("etag")
+                and os.path.exists(part_path)):
+            offset = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = part_meta["etag"]
+
+        try:
+            response = requests.get(url, stream=True, headers=headers, allow_redirects=True,
+                                    timeout=timeout)
+            if offset and past_the_end(response, offset):
+                response.close()
+                offset = 0
+                del headers["Range"], headers["If-Range"]
+                response = requests.get(url, stream=True, headers=headers, allow_redirects=True,
+                                        timeout=timeout)
+        except requests.RequestException:
+            if have_local:
+                return path
+            raise
+
+        with response:
+            if have_local and response.status_code == 304:
+                return path
+            response.raise_for_status()
+
+            etag = response.headers.get("ETag")
+            if have_local and etag and etag == meta.get("etag"):
+                return path
+
+            # 206 means the server honoured the range, anything else restarts from scratch
+            if response.status_code != 206:
+                offset = 0
+            total = content_length(response, offset)
+
+            digest = hashlib.sha256()
+            if offset:
+                with open(part_path, "rb") as f:
+                    while chunk := f.read(chunk_size):
+                        digest.update(chunk)
+            else:
+                remove_part(part_path)
+            write_atomic(part_meta_path, json.dumps({"url": url, "etag": etag}))
+
+            with open(part_path, "ab" if offset else "wb", buffering=chunk_size) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        size = os.path.getsize(part_path)
+        remote_sha256 = digest.hexdigest()
+        if (total is not None and size != total) or (sha256 and remote_sha256 != sha256):
+            os.remove(part_path)
+            os.remove(part_meta_path)
+            raise IOError(f"Download of {url} is incomplete or corrupt")
+
+        # Index before the rename so the database is never visible without it
+        ensure_indexes(part_path)
+        os.replace(part_path, path)
+        os.remove(part_meta_path)
+        write_atomic(meta_path, json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": response.headers.get("Last-Modified"),
+            "remote_sha256": remote_sha256,
+            "size": os.path.getsize(path),
+            "sha256": file_sha256(path),
+        }))
+    return path
+
+
+# Remove a partial download, its metadata and any journal SQLite left in indexing it (which
+# would otherwise be rolled back into the next download)
+def remove_part(part_path):
+    for leftover in (part_path, part_path + ".json", part_path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+# Whether a Range request for a partial download started at or past the end of the remote
+# file (416 if the server says so)
+def past_the_end(response, offset):
+    if response.status_code == 416:
+        return True
+    total = content_length(response, offset)
+    return response.status_code == 206 and total is not None and offset >= total
+
+
+# Full size of the remote file, if the server told us
+def content_length(response, offset):
+    content_range = response.headers.get("Content-Range")
+    if response.status_code == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    if length is None or response.headers.get("Content-Encoding"):
+        return None
+    return offset + int(length) if response.status_code == 206 else int(length)
@@ -0,0 +1,82 @@
+# Write search results to Excel, CSV or Parquet a chunk of rows at a time, so exporting a big
+# multi-month search never holds more than the results themselves plus one chunk (no copy of
+# the dataframe, no in-memory workbook). Compact results (see booker.results) are expanded a
+# chunk at a time as they are written.
+
+import io
+
+import numpy as np
+
+from booker.results import expand_results
+
+# label: (file extension, MIME type)
+EXPORT_FORMATS = {
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+CHUNK_SIZE = 10000
+
+
+# Results (compact or not) a chunk at a time, in the form search() returns them
+def iter_chunks(df, chunksize=CHUNK_SIZE):
+    for start in range(0, len(df), chunksize):
+        yield expand_results(df.iloc[start:start + chunksize])
+
+
+# xlsxwriter's constant_memory mode flushes each row to disk as soon as the next one starts,
+# so rows have to be written strictly in order. Links are written as plain strings (Excel
+# caps a sheet at 65,530 URLs) and the header looks like pandas' to_excel header.
+def write_excel(df, f, chunksize=CHUNK_SIZE):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(f, {'constant_memory': True, 'strings_to_urls': False})
+    worksheet = workbook.add_worksheet()
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    columns = expand_results(df.iloc[0:0]).columns
+    worksheet.write_row(0, 0, [str(column) for column in columns], header_format)
+
+    row = 1
+    for chunk in iter_chunks(df, chunksize):
+        values = chunk.astype(object).where(chunk.notna(), None).to_numpy()
+        for record in values:
+            worksheet.write_row(row, 0, [value.item() if isinstance(value, np.generic) else value
+                                         for value in record])
+            row += 1
+    workbook.close()
+
+
+def write_csv(df, f, chunksize=CHUNK_SIZE):
+    for i, chunk in enumerate(iter_chunks(df, chunksize)):
+        f.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8"))
+    if df.empty:
+        f.write(expand_results(df).to_csv(index=False).encode("utf-8"))
+
+
+def write_parquet(df, f, chunksize=CHUNK_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(expand_results(df.iloc[:chunksize]), preserve_index=False)
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in iter_chunks(df, chunksize):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {"Excel": write_excel, "CSV": write_csv, "Parquet": write_parquet}
+
+
+# Write df to a binary file object in the given format (a key of EXPORT_FORMATS)
+def write_export(df, f, fmt, chunksize=CHUNK_SIZE):
+    WRITERS[fmt](df, f, chunksize)
+
+
+def export_bytes(df, fmt, chunksize=CHUNK_SIZE):
+    output = io.BytesIO()
+    write_export(df, output, fmt, chunksize)
+    return output.getvalue()
+
+
+def export_file_name(fmt, stem="search_results"):
+    return f"{stem}.{EXPORT_FORMATS[fmt][0]}"
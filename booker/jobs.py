@@ -0,0 +1,149 @@
+# Background searches shared by every session. Search submits a job keyed by its parameters
+# and returns straight away; the page polls the job for progress and a preview of the best
+# stays so far, so reruns (eg. a filter changed mid-search) don't lose the work. Submitting a
+# search that is already queued or running returns the same job, and finished jobs are kept
+# for retain seconds so any session asking for the same search gets the result.
+#
+# Jobs run on a thread pool: the SQLite reads and most of the numpy pricing release the GIL,
+# and multi-city searches hand the cities on to their own process pool (booker.multi).
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from booker.multi import iter_city_stays, merge_city_stays
+from booker.results import compact_results
+from booker.search import iter_stays, rank_stays
+from booker.timing import SearchTimings
+
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job:
+    def __init__(self, key, clock=time.monotonic):
+        self.key = key
+        self.clock = clock
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.preview = None
+        self.result = None
+        self.error = None
+        self.timings = None
+        self.submitted = clock()
+        self.finished_at = None
+        # concurrent.futures.Future of the run, done once the job has finished (asyncio code can
+        # wait on it with asyncio.wrap_future)
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def fraction(self):
+        return self.done/self.total if self.total else 0.0
+
+    # Called by the job function as it goes
+    def report(self, done, total, message="", preview=None):
+        self.done = done
+        self.total = total
+        self.message = message
+        if preview is not None:
+            self.preview = preview
+
+
+class JobQueue:
+    def __init__(self, workers=4, retain=30*60, clock=time.monotonic):
+        self.retain = retain
+        self.clock = clock
+        self.coalesced = 0
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="booker-job")
+
+    # Forget finished jobs older than retain seconds
+    def _purge(self):
+        now = self.clock()
+        for key, job in list(self._jobs.items()):
+            if job.finished and job.finished_at + self.retain <= now:
+                del self._jobs[key]
+
+    def _run(self, job, func, args):
+        job.status = RUNNING
+        try:
+            job.result = func(job, *args)
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            job.finished_at = self.clock()
+
+    # The job for key, starting func(job, *args) on the pool unless the same search is already
+    # queued, running or recently finished. Failed jobs are retried.
+    def submit(self, key, func, *args):
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                self.coalesced += 1
+                return job
+            job = Job(key, self.clock)
+            self._jobs[key] = job
+            job.future = self._executor.submit(self._run, job, func, args)
+            return job
+
+    def get(self, key):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(key)
+
+    def stats(self):
+        with self._lock:
+            self._purge()
+            counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return dict(counts, coalesced=self.coalesced)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Job function for a search (submitted with the search parameters as the key). Streams the
+# stays a batch of hotels (or a city) at a time, reporting progress and the top preview_rows
+# stays at most every preview_every seconds, and returns the results in compact form after
+# putting them in the result cache.
+def search_job(job, params, pool, db_path, city_executor, cache, version, preview_rows=100,
+               preview_every=0.5):
+    with SearchTimings(**params._asdict()) as timings:
+        shown = 0
+        if isinstance(params.location, tuple):
+            city_stays = {}
+            for city, stays in iter_city_stays(params, params.location, db_path,
+                                               executor=city_executor, timings=timings):
+                city_stays[city] = stays
+                job.report(len(city_stays), len(params.location),
+                           f"{city} done ({len(city_stays)} of {len(params.location)} cities)",
+                           merge_city_stays(city_stays, params.sort, limit=preview_rows))
+            final_result_df = merge_city_stays(city_stays, params.sort, timings)
+        else:
+            found = []
+            for done, total, stays in iter_stays(pool.connection(), *params[:9], timings=timings):
+                found.append(stays)
+                preview = None
+                if time.monotonic() - shown > preview_every:
+                    preview = rank_stays(pd.concat(found), params.sort, limit=preview_rows)
+                    shown = time.monotonic()
+                job.report(done, total, f"{done} of {total} hotels searched", preview)
+            final_result_df = rank_stays(pd.concat(found), params.sort, timings)
+
+        with timings.stage("compact"):
+            result = cache.put(params, compact_results(final_result_df), version)
+    job.timings = timings.as_dict()
+    return result
@@ -0,0 +1,254 @@
+# Offline build of the hotel_stays table: every stay of 1-30 nights priced ahead of time, so
+# a search becomes an indexed lookup instead of a live window calculation. Run it on the
+# release database before it is published (it changes the file, and so its checksum):
+#
+#     python -m booker.materialize travel.db --nights 1-30
+#
+# A search has to give exactly the same results whichever way it is answered. The live
+# search applies the price/rating/review filters to the raw weekly rows *before* pricing,
+# so alongside the price each stay records the range of those values over the weeks it is
+# made of, plus the remainder week separately (it is left out of the price when it is
+# missing or filtered out).
+#
+# That only holds while a hotel's rows for a check-in day are all alike. Where two differ in
+# price, rating or reviews, the filters can keep one and drop the other, which the ranges
+# can't capture - so a city with any such rows isn't built, and its searches are priced live.
+
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from booker.db import HOTEL_COLUMNS, hotels_query_params
+from booker.pricing import WeeklyPrices, update_links, week_factors
+
+
+STAYS_TABLE_SQL = """CREATE TABLE IF NOT EXISTS hotel_stays (
+                         city TEXT NOT NULL,
+                         name TEXT NOT NULL,
+                         checkin_date TEXT NOT NULL,
+                         nights INTEGER NOT NULL,
+                         approx_price REAL,
+                         partial_price REAL,
+                         min_week_price REAL,
+                         max_week_price REAL,
+                         min_rating REAL,
+                         max_rating REAL,
+                         min_reviews INTEGER,
+                         last_price REAL,
+                         last_rating REAL,
+                         last_reviews INTEGER,
+                         hotel_rowid INTEGER NOT NULL,
+                         PRIMARY KEY (city, nights, checkin_date, name)
+                     ) WITHOUT ROWID"""
+
+# Cities and durations that have been built - anything else is computed live
+NIGHTS_TABLE_SQL = """CREATE TABLE IF NOT EXISTS hotel_stays_nights (
+                          city TEXT NOT NULL,
+                          nights INTEGER NOT NULL,
+                          PRIMARY KEY (city, nights)
+                      ) WITHOUT ROWID"""
+
+# The hotel's last check-in that passes the filters bounds its stays, exactly as the last
+# raw row does in the live search
+STAYS_QUERY = f"""WITH last AS (
+                      SELECT name, MAX(checkin_date) AS last_day
+                      FROM hotels
+                      WHERE city = :city
+                      AND checkin_date >= :from_
+                      AND checkin_date <= :to_
+                      AND approx_price BETWEEN :min_price AND :max_price
+                      AND rating >= :min_review_score
+                      AND rating <= :max_review_score
+                      AND reviews >= :min_reviews
+                      GROUP BY name
+                  )
+                  SELECT {', '.join('h.' + column for column in HOTEL_COLUMNS)},
+                         s.checkin_date AS stay_checkin,
+                         CASE WHEN s.last_price BETWEEN :min_price AND :max_price
+                                   AND s.last_rating >= :min_review_score
+                                   AND s.last_rating <= :max_review_score
+                                   AND s.last_reviews >= :min_reviews
+                              THEN s.approx_price ELSE s.partial_price END AS stay_price
+                  FROM hotel_stays s
+                  JOIN last l ON l.name = s.name
+                  JOIN hotels h ON h.rowid = s.hotel_rowid
+                  WHERE s.city = :city
+                  AND s.nights = :nights
+                  AND s.checkin_date >= :from_
+                  AND s.checkin_date <= date(:to_, :minus_nights)
+                  AND date(s.checkin_date, :plus_nights) <= l.last_day
+                  AND s.min_week_price >= :min_price
+                  AND s.max_week_price <= :max_price
+                  AND s.min_rating >= :min_review_score
+                  AND s.max_rating <= :max_review_score
+                  AND s.min_reviews >= :min_reviews
+
+                  ORDER BY s.name, s.checkin_date
+                  """
+
+
+# Only a SQLite database can have the hotel_stays table (a Parquet dataset is always priced live)
+def stays_built(conn, city, nights):
+    if not isinstance(conn, sqlite3.Connection):
+        return False
+    try:
+        row = conn.execute("SELECT 1 FROM hotel_stays_nights WHERE city = ? AND nights = ?",
+                           (city, nights)).fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return row is not None
+
+
+# Priced stays for a search from the hotel_stays table, in the same form price_stays returns
+def lookup_stays(conn, location, from_, to_, holiday_length, min_price, max_price,
+                 min_review_score, max_review_score, min_reviews):
+    params = dict(zip(['city', 'from_', 'to_', 'min_price', 'max_price', 'min_review_score',
+                       'max_review_score', 'min_reviews'],
+                      hotels_query_params(location, from_, to_, min_price, max_price,
+                                          min_review_score, max_review_score, min_reviews)))
+    params['nights'] = holiday_length
+    params['plus_nights'] = f"+{holiday_length} days"
+    params['minus_nights'] = f"-{holiday_length} days"
+    stays = pd.read_sql(STAYS_QUERY, con=conn, params=params)
+
+    checkin = pd.to_datetime(stays.pop('stay_checkin')).to_numpy(dtype='datetime64[D]')
+    checkin_str = np.datetime_as_string(checkin, unit='D')
+    checkout_str = np.datetime_as_string(checkin + holiday_length, unit='D')
+    checkout_orig = np.datetime_as_string(
+        pd.to_datetime(stays['checkout_date']).to_numpy(dtype='datetime64[D]'), unit='D')
+
+    stays['checkin_date'] = checkin_str.astype(object)
+    stays['checkout_date'] = checkout_str.astype(object)
+    stays['hotel_link'] = update_links(stays['hotel_link'], checkin_str, checkout_orig, checkout_str)
+    stays['approx_price'] = stays.pop('stay_price').astype(float)
+    return stays
+
+
+# Every stay of the given lengths for one city, as rows for hotel_stays
+def city_stays(rows, nights):
+    weekly = WeeklyPrices(rows, max(nights))
+    min_price = weekly.cells(rows['approx_price'], np.minimum, np.inf)
+    max_price = weekly.cells(rows['approx_price'], np.maximum, -np.inf)
+    min_rating = weekly.cells(rows['rating'], np.minimum, np.inf)
+    max_rating = weekly.cells(rows['rating'], np.maximum, -np.inf)
+    min_reviews = weekly.cells(rows['reviews'], np.minimum, np.inf)
+    hotel_rowid = rows['hotel_rowid'].to_numpy()
+    city = rows['city'].iloc[0]
+
+    for holiday_length in nights:
+        shape = (weekly.n_hotels, weekly.n_days)
+        valid = np.ones(shape, dtype=bool)
+        partial = np.zeros(shape)
+        aggregates = [np.full(shape, np.inf), np.full(shape, -np.inf), np.full(shape, np.inf),
+                      np.full(shape, -np.inf), np.full(shape, np.inf)]
+        last = [np.full(shape, np.nan) for _ in range(3)]
+        remainder = np.zeros(shape)
+
+        # Same order of additions as WeeklyPrices.stay_prices, so the full price comes out
+        # identical to the live calculation
+        for offset, factor, required in week_factors(holiday_length):
+            present = weekly.week(weekly.present, offset)
+            term = np.where(present, weekly.week(weekly.prices, offset)*factor, 0)
+            if required:
+                valid &= present
+                partial = partial + term
+                for i, (matrix, ufunc) in enumerate(zip(
+                        [min_price, max_price, min_rating, max_rating, min_reviews],
+                        [np.minimum, np.maximum, np.minimum, np.maximum, np.minimum])):
+                    aggregates[i] = ufunc(aggregates[i], weekly.week(matrix, offset))
+            else:
+                remainder = term
+                for i, matrix in enumerate([min_price, min_rating, min_reviews]):
+                    last[i] = np.where(present, weekly.week(matrix, offset), np.nan)
+
+        stay_hotel, stay_day = np.nonzero(valid)
+        cell = (stay_hotel, stay_day)
+        full = partial + remainder
+        checkin_str = weekly.dates(stay_day)
+        yield from zip(
+            [city]*len(stay_hotel),
+            weekly.hotel_names[stay_hotel].tolist(),
+            checkin_str.tolist(),
+            [holiday_length]*len(stay_hotel),
+            [round(price, 2) for price in full[cell].tolist()],
+            [round(price, 2) for price in partial[cell].tolist()],
+            *[matrix[cell].tolist() for matrix in aggregates],
+            *[matrix[cell].tolist() for matrix in last],
+            hotel_rowid[weekly.first_row[cell]].tolist(),
+        )
+
+
+# Build the stays of every length in nights for each city (every city if not given), calling
+# progress(city, weekly rows, built) as each city is done. A city with differing rows for a
+# hotel's check-in day is left unbuilt (see above).
+def build_stays(db_path, nights=range(1, 31), cities=None, progress=None):
+    nights = sorted(set(nights))
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(STAYS_TABLE_SQL)
+            conn.execute(NIGHTS_TABLE_SQL)
+            if cities is None:
+                cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels ORDER BY city")]
+
+            for city in cities:
+                rows = pd.read_sql("""SELECT rowid AS hotel_rowid, city, name, checkin_date,
+                                             approx_price, rating, reviews
+                                      FROM hotels
+                                      WHERE city = ?
+                                      ORDER BY name, checkin_date, rowid""",
+                                   con=conn, params=(city,))
+                in_nights = f"nights IN ({', '.join('?'*len(nights))})"
+                conn.execute(f"DELETE FROM hotel_stays WHERE city = ? AND {in_nights}", (city, *nights))
+                distinct = rows.drop_duplicates(['name', 'checkin_date', 'approx_price', 'rating', 'reviews'])
+                built = not distinct.duplicated(['name', 'checkin_date']).any()
+                if not built:
+                    conn.execute(f"DELETE FROM hotel_stays_nights WHERE city = ? AND {in_nights}", (city, *nights))
+                else:
+                    if not rows.empty:
+                        conn.executemany(f"INSERT INTO hotel_stays VALUES ({', '.join('?'*15)})",
+                                         city_stays(rows, nights))
+                    conn.executemany("INSERT OR IGNORE INTO hotel_stays_nights VALUES (?, ?)",
+                                     [(city, n) for n in nights])
+                if progress is not None:
+                    progress(city, len(rows), built)
+            # Planner statistics for the new table, as ensure_indexes gathers for hotels
+            conn.execute("ANALYZE hotel_stays")
+    finally:
+        conn.close()
+
+
+# Progress for the command line
+def print_progress(city, rows, built):
+    print(f"{city}: {rows} weekly rows" + ("" if built else ", not built (a hotel has differing rows for a day)"))
+
+
+# "1-30" or "5,7,14"
+def parse_nights(value):
+    nights = []
+    for part in value.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            nights.extend(range(int(first), int(last) + 1))
+        else:
+            nights.append(int(part))
+    if not all(1 <= n <= 30 for n in nights):
+        raise argparse.ArgumentTypeError("nights must be between 1 and 30")
+    return nights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute hotel_stays for travel.db")
+    parser.add_argument("db", help="path to travel.db")
+    parser.add_argument("--nights", type=parse_nights, default=list(range(1, 31)),
+                        help="holiday lengths to build, eg. 1-30 or 5,7,14 (default 1-30)")
+    parser.add_argument("--city", action="append", dest="cities",
+                        help="only rebuild this city (can be repeated)")
+    args = parser.parse_args(argv)
+    build_stays(args.db, args.nights, args.cities, print_progress)
+
+
+if __name__ == "__main__":
+    main()
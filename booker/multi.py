@@ -0,0 +1,96 @@
+# Search the same window across many cities at once. Each city is priced in a separate
+# process (pricing is CPU bound, so threads would queue up behind the GIL), results are
+# handed back as each city finishes, and the merged stays get a single cross-city VM ranking.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from booker.db import HOTEL_COLUMNS, db_version
+from booker.parquet import open_source
+from booker.search import find_stays, rank_stays
+from booker.timing import SearchTimings
+
+
+_conn = None
+_db_path = None
+_version = None
+
+
+def _open_worker_db(db_path):
+    global _conn, _db_path, _version
+    _db_path, _version = db_path, db_version(db_path)
+    _conn = open_source(db_path)
+
+
+# The worker's connection, reopened if a new release has replaced the database since it was
+# opened (see booker.db.ConnectionPool)
+def _worker_db():
+    if db_version(_db_path) != _version:
+        _conn.close()
+        _open_worker_db(_db_path)
+    return _conn
+
+
+def _city_stays(params, materialized):
+    timings = SearchTimings()
+    stays = find_stays(_worker_db(), params.location, params.from_, params.to_, params.holiday_length,
+                       params.min_price, params.max_price, params.min_review_score,
+                       params.max_review_score, params.min_reviews, materialized=materialized,
+                       timings=timings)
+    return params.location, stays, timings.stages
+
+
+# Worker processes each hold one read-only connection to db_path (or open the booker.parquet
+# dataset there). Workers are spawned rather than forked, as forking a process that is running
+# other threads (eg. Streamlit) isn't safe.
+def city_pool(db_path, workers=None):
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_open_worker_db, initargs=(db_path,))
+
+
+# Yield (city, priced stays) for each city as soon as it is done. params.location is ignored.
+# Pass an executor from city_pool to reuse its workers between searches. Each worker's stage
+# timings are added to timings, tagged with the city.
+def iter_city_stays(params, cities, db_path, workers=None, executor=None, materialized=True,
+                    timings=None):
+    timings = timings or SearchTimings()
+    own_executor = executor is None
+    if own_executor:
+        executor = city_pool(db_path, workers)
+    try:
+        futures = [executor.submit(_city_stays, params._replace(location=city), materialized)
+                   for city in cities]
+        for future in as_completed(futures):
+            city, stays, stages = future.result()
+            timings.extend(stages, city=city)
+            yield city, stays
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+# Merge the stays found so far ({city: stays}) and rank them together, keeping the top limit
+# if given. Cities are merged in name order so ties rank the same however the workers finish.
+# With no stays at all the result is still ranked, so it has the columns of a single-city
+# search (a city's empty stays carry the nights column of a range of lengths).
+def merge_city_stays(city_stays, sort, timings=None, limit=None):
+    found = [stays for city, stays in sorted(city_stays.items()) if not stays.empty]
+    if not found:
+        found = [next(iter(city_stays.values()), pd.DataFrame(columns=HOTEL_COLUMNS))]
+    return rank_stays(pd.concat(found, ignore_index=True), sort, timings, limit)
+
+
+def search_cities(params, cities, db_path, workers=None, executor=None, materialized=True,
+                  timings=None, limit=None):
+    if timings is None:
+        with SearchTimings(**params._replace(location=tuple(cities))._asdict()) as timings:
+            return search_cities(params, cities, db_path, workers, executor, materialized,
+                                 timings, limit)
+
+    city_stays = dict(iter_city_stays(params, cities, db_path, workers, executor, materialized,
+                                      timings))
+    return merge_city_stays(city_stays, params.sort, timings, limit)
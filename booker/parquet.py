@@ -0,0 +1,284 @@
+# The hotels data as a Parquet dataset partitioned by city and check-in month, as an
+# alternative to travel.db. A search only reads (and, from a web server, only downloads) the
+# files for its city and months, instead of needing the whole database first:
+#
+#     python -m booker.parquet travel.db hotels/
+#     python -m booker search --db hotels/ --city "Madrid, Spain" ...
+#     python -m booker search --db https://example.com/hotels/ --city "Madrid, Spain" ...
+#
+# Layout: manifest.json (dataset version and the months each city has) plus one file per
+# partition at city=<url-quoted city>/month=<YYYY-MM>/part-0.parquet. Files are sorted by
+# name and check-in and written in small row groups, so the price/rating/review filters are
+# pushed down to pyarrow and skip row groups using their statistics.
+#
+# ParquetStore answers the same queries as a SQLite connection (booker.db.query_hotels,
+# iter_hotels and count_hotels hand them over), so the pandas search engine works on either.
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from booker.db import HOTEL_COLUMNS, db_version, hotels_query_params, open_db
+from booker.download import CHUNK_SIZE, HEADERS, file_sha256, write_atomic
+
+
+MANIFEST = "manifest.json"
+ROW_GROUP_SIZE = 10000
+# Seconds before a remote dataset's manifest is read again
+MANIFEST_TTL = 5*60
+
+# Remote datasets' manifests by URL, as (manifest, time read). ParquetStore and db_version
+# share them, so the stores and the result cache keys move to a new dataset together.
+_remote_manifests = {}
+_remote_lock = threading.Lock()
+
+
+def schema():
+    import pyarrow as pa
+
+    return pa.schema([('city', pa.string()), ('name', pa.string()), ('checkin_date', pa.string()),
+                      ('checkout_date', pa.string()), ('approx_price', pa.float64()),
+                      ('rating', pa.float64()), ('reviews', pa.int64()), ('hotel_link', pa.string())])
+
+
+def partition_path(city, month):
+    return f"city={quote(city, safe='')}/month={month}/part-0.parquet"
+
+
+def is_remote(path):
+    return path.startswith(("http://", "https://"))
+
+
+def is_dataset(path):
+    return is_remote(path) or os.path.isdir(path)
+
+
+# Manifest of the remote dataset at url, read again once it's MANIFEST_TTL seconds old. If
+# the server can't be reached then, the last one is kept until the next try.
+def remote_manifest(url, timeout=60):
+    import requests
+
+    url = url.rstrip("/")
+    with _remote_lock:
+        cached = _remote_manifests.get(url)
+        if cached is None or time.monotonic() - cached[1] > MANIFEST_TTL:
+            try:
+                response = requests.get(f"{url}/{MANIFEST}", headers=HEADERS, timeout=timeout)
+                response.raise_for_status()
+                cached = (response.json(), time.monotonic())
+            except requests.RequestException:
+                if cached is None:
+                    raise
+                cached = (cached[0], time.monotonic())
+            _remote_manifests[url] = cached
+        return cached[0]
+
+
+# A ParquetStore for a dataset directory or URL, otherwise a read-only SQLite connection
+def open_source(path):
+    return ParquetStore(path) if is_dataset(path) else open_db(path)
+
+
+# Write the hotels table of travel.db out as a partitioned dataset in out_dir, a city at a time
+def convert_db(db_path, out_dir, row_group_size=ROW_GROUP_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    conn = sqlite3.connect(db_path)
+    partitions = {}
+    try:
+        cities = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels ORDER BY city")]
+        for city in cities:
+            rows = pd.read_sql(f"""SELECT {', '.join(HOTEL_COLUMNS)}
+                                   FROM hotels
+                                   WHERE city = ?
+                                   ORDER BY name, checkin_date, rowid""", con=conn, params=(city,))
+            months = rows['checkin_date'].str[:7]
+            partitions[city] = sorted(months.unique().tolist())
+            for month in partitions[city]:
+                path = os.path.join(out_dir, partition_path(city, month))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                table = pa.Table.from_pandas(rows[months == month], schema=schema(), preserve_index=False)
+                pq.write_table(table, path + ".tmp", row_group_size=row_group_size)
+                os.replace(path + ".tmp", path)
+    finally:
+        conn.close()
+
+    # Written last, so a reader never sees partitions missing from the manifest
+    manifest = {"version": file_sha256(db_path), "partitions": partitions}
+    write_atomic(os.path.join(out_dir, MANIFEST), json.dumps(manifest))
+    return manifest
+
+
+def months_between(from_, to_):
+    first = date.fromisoformat(str(from_)[:10])
+    last = date.fromisoformat(str(to_)[:10])
+    months = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+# Reads searches from a dataset written by convert_db, in a local directory or on a web
+# server. Remote partitions are downloaded the first time they are needed and kept in
+# cache_dir (under the dataset version, so a new dataset never mixes with an old one).
+# Safe to share between threads - connection() returns the store itself, so it can stand in
+# for a ConnectionPool.
+#
+# Like ConnectionPool, connection() picks up a new dataset: the manifest is read again when a
+# local one has been rewritten (its db_version changes), and a remote one every
+# MANIFEST_TTL seconds (see remote_manifest).
+class ParquetStore:
+    def __init__(self, root, cache_dir=None, timeout=60):
+        self.root = root.rstrip("/")
+        self.remote = is_remote(root)
+        self.timeout = timeout
+        self.cache_root = cache_dir or os.path.join(tempfile.gettempdir(), "booker-parquet")
+        self._lock = threading.Lock()
+        self._load()
+
+    # The manifest is swapped in as one attribute, so a search never sees half of an update
+    def _load(self):
+        if self.remote:
+            self.manifest = remote_manifest(self.root, self.timeout)
+            return
+        self.opened = db_version(self.root)
+        with open(os.path.join(self.root, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    # Local path of a partition, downloading it first if the dataset is remote
+    def _partition(self, path, version):
+        if not self.remote:
+            return os.path.join(self.root, path)
+        local_path = os.path.join(self.cache_root, version, path)
+        with self._lock:
+            if not os.path.exists(local_path):
+                import requests
+
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                # The directory names are URL-quoted already, and have to stay that way on the server
+                with requests.get(f"{self.root}/{quote(path)}", headers=HEADERS, stream=True,
+                                  timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    with open(local_path + ".part", "wb") as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+                os.replace(local_path + ".part", local_path)
+        return local_path
+
+    def files(self, city, from_, to_):
+        manifest = self.manifest
+        months = set(manifest["partitions"].get(city, ()))
+        return [self._partition(partition_path(city, month), manifest["version"])
+                for month in months_between(from_, to_) if month in months]
+
+    # The partitions a search reads as a pyarrow dataset (None if there are none), and the
+    # filter for its rows
+    def _scan(self, location, from_, to_, min_price, max_price, min_review_score,
+              max_review_score, min_reviews):
+        import pyarrow.dataset as ds
+
+        location, from_, to_, *filters = hotels_query_params(location, from_, to_, min_price, max_price,
+                                                             min_review_score, max_review_score, min_reviews)
+        min_price, max_price, min_review_score, max_review_score, min_reviews = filters
+        files = self.files(location, from_, to_)
+        expression = ((ds.field('checkin_date') >= from_) & (ds.field('checkin_date') <= to_)
+                      & (ds.field('approx_price') >= min_price) & (ds.field('approx_price') <= max_price)
+                      & (ds.field('rating') >= min_review_score) & (ds.field('rating') <= max_review_score)
+                      & (ds.field('reviews') >= min_reviews))
+        if not files:
+            return None, expression
+        return ds.dataset(files, schema=schema(), format="parquet"), expression
+
+    def _table(self, *search):
+        dataset, expression = self._scan(*search)
+        if dataset is None:
+            return schema().empty_table()
+        return dataset.to_table(filter=expression)
+
+    # Ordered by name and check-in, duplicates in the order they were in the database (the
+    # partitions are read in month order, and each is in the database's order)
+    @staticmethod
+    def _sorted(table):
+        return table.to_pandas().sort_values(['name', 'checkin_date'], kind='stable')
+
+    # Same dataframe as booker.db.query_hotels
+    def query_hotels(self, *search):
+        return self._sorted(self._table(*search)).reset_index(drop=True)
+
+    # Same batches as booker.db.iter_hotels: whole hotels, about chunksize rows at a time. Only
+    # the name column is read for the whole search, to count each hotel's rows and split them
+    # into batches the way fetchmany does. Each batch is then read on its own, filtered to its
+    # range of names - partitions are sorted by name, so row groups outside it are skipped.
+    def iter_hotels(self, *search, chunksize=5000):
+        import pyarrow.dataset as ds
+
+        dataset, expression = self._scan(*search)
+        if dataset is None:
+            return
+        counts = dataset.to_table(columns=['name'], filter=expression)['name'].to_pandas().value_counts().sort_index()
+        names = counts.index.to_numpy()
+        bounds = np.concatenate([[0], np.cumsum(counts.to_numpy())])
+        total = int(bounds[-1])
+
+        def batch(start, end):
+            first, last = np.searchsorted(bounds, [start, end])
+            names_filter = (ds.field('name') >= names[first]) & (ds.field('name') <= names[last - 1])
+            df = self._sorted(dataset.to_table(filter=expression & names_filter))
+            df.index = pd.RangeIndex(start, end)
+            return df
+
+        start = fetched = 0
+        while fetched < total:
+            fetched = min(fetched + chunksize, total)
+            # Start of the hotel the last fetched row belongs to
+            split = int(bounds[np.searchsorted(bounds, fetched - 1, side='right') - 1])
+            if split > start:
+                yield batch(start, split)
+                start = split
+        if start < total:
+            yield batch(start, total)
+
+    def count_hotels(self, *search):
+        return len(self._table(*search)['name'].unique())
+
+    def connection(self):
+        if self.remote:
+            self.manifest = remote_manifest(self.root, self.timeout)
+        elif db_version(self.root) != self.opened:
+            with self._lock:
+                self._load()
+        return self
+
+    def close(self):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert travel.db to a partitioned Parquet dataset")
+    parser.add_argument("db", help="path to travel.db")
+    parser.add_argument("out", help="output directory")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args(argv)
+    manifest = convert_db(args.db, args.out, args.row_group_size)
+    partitions = sum(len(months) for months in manifest["partitions"].values())
+    print(f"{len(manifest['partitions'])} cities, {partitions} partitions written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
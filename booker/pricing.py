@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+
+# Raw results are 7 days at a time - eg. 18th - 25th March, 19th - 26th March, etc.
+# We want results for any holiday length the user enters on the app. If holiday length is
+# < 1 week, use this week's price as the approx. price. Otherwise we want to collect prices
+# at each week end, and adjust the price calculation for any remainder.
+#
+# Returns (offset in days from check-in, price factor, required) for each week. Every week
+# is required except the last of a holiday of a week or more, which only covers the
+# remainder days and is left out of the price if it is missing.
+def week_factors(holiday_length):
+    weeks = int(holiday_length/7) + 1
+    factors = []
+    for j in range(weeks):
+        if weeks == 1:
+            factor = 1
+        elif (j+1)*7 > holiday_length:
+            days_over = (j+1)*7 - holiday_length
+            factor = (7-days_over)/holiday_length
+        else:
+            factor = 7/holiday_length
+        factors.append((7*j, factor, weeks == 1 or j < weeks - 1))
+    return factors
+
+
+# The raw weekly rows of a search laid out as a hotel x check-in day matrix, so that every
+# (hotel, check-in) stay can be priced at once using shifted columns of the matrix rather
+# than looping over each hotel and day.
+#
+# result_df is expected to be ordered by name and checkin_date (as returned by the search
+# query). Hotels are numbered in order of appearance and days from the first check-in.
+class WeeklyPrices:
+    def __init__(self, result_df, max_holiday_length=30):
+        checkin_days = pd.to_datetime(result_df['checkin_date']).to_numpy(dtype='datetime64[D]')
+        self.base_day = checkin_days.min()
+        self.day = (checkin_days - self.base_day).astype(np.int64)
+        self.hotel, self.hotel_names = pd.factorize(result_df['name'])
+        self.n_hotels = len(self.hotel_names)
+        self.n_days = int(self.day.max()) + 1
+        self.width = self.n_days + 7*(int(max_holiday_length/7) + 1)
+
+        # Weekly price per hotel and check-in day (duplicate rows are summed, as the original
+        # loop did), plus the position of the first raw row for each cell to take the other
+        # columns from
+        self.prices = np.zeros((self.n_hotels, self.width))
+        np.add.at(self.prices, (self.hotel, self.day), result_df['approx_price'].to_numpy(dtype=float))
+        self.present = np.zeros((self.n_hotels, self.width), dtype=bool)
+        self.present[self.hotel, self.day] = True
+        cell, first_pos = np.unique(self.hotel*self.width + self.day, return_index=True)
+        first_row = np.full(self.n_hotels*self.width, -1, dtype=np.int64)
+        first_row[cell] = first_pos
+        self.first_row = first_row.reshape(self.n_hotels, self.width)
+
+        self.first_day = np.full(self.n_hotels, self.n_days, dtype=np.int64)
+        np.minimum.at(self.first_day, self.hotel, self.day)
+        self.last_day = np.full(self.n_hotels, -1, dtype=np.int64)
+        np.maximum.at(self.last_day, self.hotel, self.day)
+
+    # Per cell matrix of another column, combining duplicate rows with ufunc
+    def cells(self, values, ufunc, fill):
+        matrix = np.full((self.n_hotels, self.width), fill, dtype=float)
+        ufunc.at(matrix, (self.hotel, self.day), np.asarray(values, dtype=float))
+        return matrix
+
+    # Shifted view of a cell matrix: column d holds the value for check-in d + offset
+    def week(self, matrix, offset):
+        return matrix[:, offset:offset + self.n_days]
+
+    # (hotel x check-in day) mask of stays with every required week-end present, and their
+    # unrounded prices. Sum over the collected prices week by week (works as an average due
+    # to scaling) in the same order as the original loop so the floats come out identical.
+    def stay_prices(self, holiday_length):
+        valid = np.ones((self.n_hotels, self.n_days), dtype=bool)
+        total = np.zeros((self.n_hotels, self.n_days))
+        for offset, factor, required in week_factors(holiday_length):
+            present = self.week(self.present, offset)
+            if required:
+                valid &= present
+            total = total + np.where(present, self.week(self.prices, offset)*factor, 0)
+        return valid, total
+
+    # Check-in days between the first day each hotel appears and holiday_length days before
+    # the last
+    def in_window(self, holiday_length):
+        checkin = np.arange(self.n_days)
+        return (checkin >= self.first_day[:, None]) & (checkin <= (self.last_day - holiday_length)[:, None])
+
+    # (hotel, check-in day, unrounded price) of every stay of holiday_length days that can be
+    # priced, ordered by hotel then check-in. The number of candidate stays (hotel, check-in
+    # day pairs in the window) is added to stats['windows'].
+    def priced_stays(self, holiday_length, stats=None):
+        valid, total = self.stay_prices(holiday_length)
+        window = self.in_window(holiday_length)
+        if stats is not None:
+            stats['windows'] = stats.get('windows', 0) + int(window.sum())
+        stay_hotel, stay_day = np.nonzero(valid & window)
+        return stay_hotel, stay_day, total[stay_hotel, stay_day]
+
+    # holiday_length can be an array, one per stay
+    def dates(self, stay_day, holiday_length=0):
+        return np.datetime_as_string(self.base_day + stay_day + holiday_length, unit='D')
+
+
+# Price every stay of holiday_length days in the search results. The output matches the
+# original per-hotel loop: one row per priced stay, ordered by hotel then check-in, with
+# check-in/out as "%Y-%m-%d" strings and the hotel link updated to the new dates.
+#
+# If a stats dict is passed, the number of hotels and of candidate stays (hotel, check-in day
+# pairs in the window) priced are added to it.
+def price_stays(result_df, holiday_length, stats=None):
+    if result_df.empty:
+        return result_df.iloc[0:0].copy()
+
+    weekly = WeeklyPrices(result_df, holiday_length)
+    if stats is not None:
+        stats['hotels'] = stats.get('hotels', 0) + weekly.n_hotels
+    return stay_rows(weekly, result_df, *weekly.priced_stays(holiday_length, stats), holiday_length)
+
+
+# Lengths a holiday_length covers - either one number of nights, or a (shortest, longest)
+# range searched in one go with price_durations
+def holiday_lengths(holiday_length):
+    if isinstance(holiday_length, tuple):
+        shortest, longest = holiday_length
+        return list(range(shortest, longest + 1))
+    return [holiday_length]
+
+
+# Stays with the nights column a search over a range of lengths adds
+def add_nights(stays, nights):
+    stays.insert(stays.columns.get_loc('checkout_date') + 1, 'nights', nights)
+    return stays
+
+
+# Price every stay of each length in holiday_lengths, as one frame with a nights column
+# (ordered by length, then hotel and check-in). The raw rows are laid out in one WeeklyPrices
+# matrix wide enough for the longest stay and shared by every length, and the rows for every
+# length are built together - so each extra length only costs its shifted sums and its share
+# of the output. The stays of each length are exactly what price_stays gives.
+def price_durations(result_df, holiday_lengths, stats=None):
+    holiday_lengths = sorted(set(holiday_lengths))
+    if result_df.empty:
+        return add_nights(result_df.iloc[0:0].copy(), 0)
+
+    weekly = WeeklyPrices(result_df, max(holiday_lengths))
+    if stats is not None:
+        stats['hotels'] = stats.get('hotels', 0) + weekly.n_hotels
+    priced = [weekly.priced_stays(length, stats) for length in holiday_lengths]
+    stay_hotel, stay_day, prices = (np.concatenate(column) for column in zip(*priced))
+    nights = np.repeat(holiday_lengths, [len(length_stays[0]) for length_stays in priced])
+    return add_nights(stay_rows(weekly, result_df, stay_hotel, stay_day, prices, nights), nights)
+
+
+# Rows for priced stays of result_df (see WeeklyPrices.priced_stays) of holiday_length days,
+# which can be one length or an array of one per stay
+def stay_rows(weekly, result_df, stay_hotel, stay_day, prices, holiday_length):
+    if len(stay_hotel) == 0:
+        return result_df.iloc[0:0].copy()
+
+    # Everything else being constant, we are ok to take the first row of each stay, add in
+    # our calculated price, and change the date information
+    stays = result_df.iloc[weekly.first_row[stay_hotel, stay_day]].copy()
+
+    checkin_str = weekly.dates(stay_day)
+    checkout_str = weekly.dates(stay_day, holiday_length)
+    checkout_orig = np.datetime_as_string(
+        pd.to_datetime(stays['checkout_date']).to_numpy(dtype='datetime64[D]'), unit='D')
+
+    stays['checkin_date'] = checkin_str.astype(object)
+    stays['checkout_date'] = checkout_str.astype(object)
+    stays['hotel_link'] = update_links(stays['hotel_link'], checkin_str, checkout_orig, checkout_str)
+    # Python's round rather than np.round, which disagrees on half-cent ties
+    stays['approx_price'] = [round(price, 2) for price in prices.tolist()]
+    return stays
+
+
+# Swap the dates in each Booking.com link for the new stay's dates
+def update_links(links, checkin_str, checkout_orig, checkout_str):
+    return [
+        str(link).replace("checkin={0}&checkout={1}".format(cin, cout_orig),
+                          "checkin={0}&checkout={1}".format(cin, cout))
+        for link, cin, cout_orig, cout in zip(links, checkin_str, checkout_orig, checkout_str)
+    ]
@@ -0,0 +1,84 @@
+# Compact in-memory form of search results, for keeping them in the result cache and session.
+#
+# A few thousand hotels make up tens of thousands of stays, so the repeated strings are
+# stored once: city and name become categoricals, and the Booking.com link becomes a per-hotel
+# template with the dates swapped for placeholders (a categorical too). Dates are datetime64
+# and the numbers are 32 bit or smaller. expand_results turns it back into exactly what
+# search() returns, and is only run on the rows being displayed or exported.
+
+import numpy as np
+import pandas as pd
+
+
+CHECKIN_TOKEN = "{checkin}"
+CHECKOUT_TOKEN = "{checkout}"
+
+# float32 keeps ~7 significant digits, so values are rounded back on the way out
+FLOAT_DECIMALS = {'approx_price': 2, 'rating': 2}
+
+
+def is_compact(df):
+    return 'link_template' in df.columns
+
+
+def compact_results(df):
+    if is_compact(df):
+        return df
+
+    compact = pd.DataFrame(index=df.index)
+    for column in df.columns:
+        values = df[column]
+        if column in ('city', 'name'):
+            compact[column] = values.astype('category')
+        elif column in ('checkin_date', 'checkout_date'):
+            compact[column] = pd.to_datetime(values)
+        elif column == 'hotel_link':
+            checkin = pd.to_datetime(df['checkin_date']).dt.strftime("%Y-%m-%d")
+            checkout = pd.to_datetime(df['checkout_date']).dt.strftime("%Y-%m-%d")
+            compact['link_template'] = pd.Categorical([
+                str(link).replace("checkin={0}&checkout={1}".format(cin, cout),
+                                  "checkin={0}&checkout={1}".format(CHECKIN_TOKEN, CHECKOUT_TOKEN))
+                for link, cin, cout in zip(values, checkin, checkout)
+            ])
+        elif column == 'vm_score':
+            compact[column] = values.astype(np.int8)
+        elif pd.api.types.is_integer_dtype(values):
+            compact[column] = values.astype(np.int32)
+        elif pd.api.types.is_float_dtype(values):
+            compact[column] = values.astype(np.float32)
+        else:
+            compact[column] = values
+    return compact
+
+
+def expand_results(df):
+    if not is_compact(df):
+        return df
+
+    expanded = pd.DataFrame(index=df.index)
+    checkin = checkout = None
+    for column in df.columns:
+        values = df[column]
+        if column in ('city', 'name'):
+            expanded[column] = values.astype(object)
+        elif column in ('checkin_date', 'checkout_date'):
+            dates = values.dt.strftime("%Y-%m-%d").astype(object)
+            expanded[column] = dates
+            if column == 'checkin_date':
+                checkin = dates
+            else:
+                checkout = dates
+        elif column == 'link_template':
+            expanded['hotel_link'] = [
+                template.replace(CHECKIN_TOKEN, cin).replace(CHECKOUT_TOKEN, cout)
+                for template, cin, cout in zip(values.astype(object), checkin, checkout)
+            ]
+        elif column == 'vm_score':
+            expanded[column] = values.astype(int)
+        elif pd.api.types.is_integer_dtype(values):
+            expanded[column] = values.astype(np.int64)
+        elif pd.api.types.is_float_dtype(values):
+            expanded[column] = values.astype(np.float64).round(FLOAT_DECIMALS.get(column, 6))
+        else:
+            expanded[column] = values
+    return expanded
@@ -0,0 +1,216 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from booker.db import HOTEL_COLUMNS, count_hotels, iter_hotels, open_db, query_hotels
+from booker.download import DB_PATH, DB_URL, download_db
+from booker.materialize import lookup_stays, stays_built
+from booker.pricing import add_nights, holiday_lengths, price_durations, price_stays
+from booker.sql_engine import sql_search
+from booker.timing import SearchTimings
+
+
+SORT_OPTIONS = ("Price", "Rating", "Price & Rating")
+
+# "pandas" prices stays in Python from the raw rows, "sql" inside SQLite (booker.sql_engine)
+ENGINES = ("pandas", "sql")
+
+# Everything the user picks on the app. Hashable, so it doubles as the result cache key.
+# holiday_length is a number of nights, or a (shortest, longest) tuple to search every length
+# in between at once - the results then have a nights column.
+SearchParams = namedtuple('SearchParams', ['location', 'from_', 'to_', 'holiday_length',
+                                           'min_price', 'max_price', 'min_review_score',
+                                           'max_review_score', 'min_reviews', 'sort'],
+                          defaults=(0, 5000, 6.0, 9.9, 0, "Price"))
+
+
+# Percentile of each value within values, the same as scipy's
+# stats.percentileofscore(values, values) (kind='rank') but from one sort and two binary
+# searches instead of comparing every value with every other one. Any NaN makes every
+# percentile NaN, as it does in scipy.
+def percentile_ranks(values):
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0 or np.isnan(values).any():
+        return np.full(n, np.nan)
+    ordered = np.sort(values)
+    left = np.searchsorted(ordered, values, side='left')
+    right = np.searchsorted(ordered, values, side='right')
+    return (left + right + (left < right)) * (50.0 / n)
+
+
+# Build VM (Value for Money) score. Scale columns to be within a range of 0 and 1 - price is
+# represented as the percentile value over all prices
+def add_vm_score(final_result_df):
+    final_result_df['price_percentile'] = percentile_ranks(final_result_df['approx_price'])*0.01
+    final_result_df['rating_scaled'] = final_result_df['rating']*0.1
+    final_result_df['vm_score_unrounded'] = 100*(((1-final_result_df['price_percentile'])+final_result_df['rating_scaled'])/2)
+    return final_result_df
+
+
+# (column, ascending) each sort option orders by
+SORT_COLUMNS = {
+    'Price': ('approx_price', True),
+    'Rating': ('rating', False),
+    'Price & Rating': ('vm_score_unrounded', False),
+}
+
+
+# Sort final results based on user input. With a limit only the best stays are kept, picked
+# with a partial selection (nsmallest/nlargest) rather than sorting every stay.
+def sort_results(final_result_df, sort, limit=None):
+    if limit is not None and limit < len(final_result_df):
+        column, ascending = SORT_COLUMNS[sort]
+        if ascending:
+            return final_result_df.nsmallest(limit, column)
+        return final_result_df.nlargest(limit, column)
+    if sort == 'Price & Rating':
+        return final_result_df.sort_values(by='vm_score_unrounded', ascending=False)
+    elif sort == 'Price':
+        return final_result_df.sort_values(by='approx_price', ascending=True)
+    else:
+        return final_result_df.sort_values(by='rating', ascending=False)
+
+
+# Apply rounding to VM score and drop scaled columns
+def finish_vm_score(final_result_df):
+    final_result_df['vm_score'] = round(final_result_df['vm_score_unrounded'])
+    final_result_df['vm_score'] = final_result_df['vm_score'].astype(int)
+    return final_result_df.drop(columns=['price_percentile', 'rating_scaled', 'vm_score_unrounded'])
+
+
+# True if every length holiday_length covers has been built into the hotel_stays table
+def durations_built(conn, location, holiday_length):
+    return all(stays_built(conn, location, length) for length in holiday_lengths(holiday_length))
+
+
+# Built stays for a search, looked up a length at a time for a range of lengths
+def lookup_durations(conn, location, from_, to_, holiday_length, *filters):
+    if not isinstance(holiday_length, tuple):
+        return lookup_stays(conn, location, from_, to_, holiday_length, *filters)
+    return pd.concat([add_nights(lookup_stays(conn, location, from_, to_, length, *filters), length)
+                      for length in holiday_lengths(holiday_length)])
+
+
+# Price every stay of holiday_length days in the window. Durations that have been built into
+# the hotel_stays table (see booker.materialize) are looked up, anything else is calculated
+# live from the raw 7 night results unless live_fallback is off. For a range of lengths the
+# raw results are read and laid out once for all of them.
+def find_stays(conn, location, from_, to_, holiday_length, min_price=0, max_price=5000,
+               min_review_score=6.0, max_review_score=9.9, min_reviews=0, materialized=True,
+               live_fallback=True, timings=None):
+    timings = timings or SearchTimings()
+    filters = (min_price, max_price, min_review_score, max_review_score, min_reviews)
+    if materialized and durations_built(conn, location, holiday_length):
+        with timings.stage("lookup") as stage:
+            stays = lookup_durations(conn, location, from_, to_, holiday_length, *filters)
+            stage['rows'] = len(stays)
+        return stays
+    if not live_fallback:
+        raise LookupError(f"Stays of {holiday_length} nights have not been built")
+
+    with timings.stage("query") as stage:
+        result_df = query_hotels(conn, location, from_, to_, *filters)
+        stage['rows'] = len(result_df)
+    return price_hotels(result_df, holiday_length, timings)
+
+
+# Price the stays in a batch of raw results from the query
+def price_hotels(result_df, holiday_length, timings):
+    with timings.stage("dates") as stage:
+        result_df['checkin_date'] = pd.to_datetime(result_df['checkin_date']).dt.date
+        result_df['checkout_date'] = pd.to_datetime(result_df['checkout_date']).dt.date
+        stage['rows'] = len(result_df)
+    with timings.stage("pricing") as stage:
+        if isinstance(holiday_length, tuple):
+            stays = price_durations(result_df, holiday_lengths(holiday_length), stage)
+        else:
+            stays = price_stays(result_df, holiday_length, stage)
+        stage['stays'] = len(stays)
+    return stays
+
+
+# Streaming version of find_stays for showing results as they are found. Yields (hotels done,
+# hotels in total, priced stays for the latest batch of hotels), reading the raw results a
+# batch of whole hotels at a time. Built durations are looked up in one go.
+def iter_stays(conn, location, from_, to_, holiday_length, min_price=0, max_price=5000,
+               min_review_score=6.0, max_review_score=9.9, min_reviews=0, materialized=True,
+               chunksize=5000, timings=None):
+    timings = timings or SearchTimings()
+    filters = (min_price, max_price, min_review_score, max_review_score, min_reviews)
+    if materialized and durations_built(conn, location, holiday_length):
+        with timings.stage("lookup") as stage:
+            stays = lookup_durations(conn, location, from_, to_, holiday_length, *filters)
+            stage['rows'] = len(stays)
+        yield 1, 1, stays
+        return
+
+    with timings.stage("count") as stage:
+        total = count_hotels(conn, location, from_, to_, *filters)
+        stage['hotels'] = total
+    done = 0
+    batches = iter_hotels(conn, location, from_, to_, *filters, chunksize=chunksize)
+    while True:
+        with timings.stage("query") as stage:
+            result_df = next(batches, None)
+            stage['rows'] = 0 if result_df is None else len(result_df)
+        if result_df is None:
+            break
+        done += result_df['name'].nunique()
+        yield done, total, price_hotels(result_df, holiday_length, timings)
+    if done == 0:
+        empty = pd.DataFrame(columns=HOTEL_COLUMNS)
+        yield 0, 0, add_nights(empty, 0) if isinstance(holiday_length, tuple) else empty
+
+
+# Run a full booking search: price every stay in the window, then score and sort them. Without
+# a connection the release database is used, downloading it first if needed. Stage timings
+# go to timings if given, otherwise the search is timed and logged on its own.
+#
+# engine is one of ENGINES, and limit keeps only the top stays in the sort order. The sql
+# engine never reads the hotel_stays table, and applies the limit inside SQLite.
+def search(params, conn=None, materialized=True, live_fallback=True, timings=None,
+           engine="pandas", limit=None):
+    options = dict(materialized=materialized, live_fallback=live_fallback, engine=engine,
+                   limit=limit)
+    if conn is None:
+        conn = open_db(download_db(DB_URL, DB_PATH))
+        try:
+            return search(params, conn, timings=timings, **options)
+        finally:
+            conn.close()
+
+    if timings is None:
+        with SearchTimings(**params._asdict(), engine=engine) as timings:
+            return search(params, conn, timings=timings, **options)
+
+    if engine == "sql":
+        return sql_search(conn, params, limit, timings)
+    if engine != "pandas":
+        raise ValueError(f"Unknown search engine: {engine}")
+
+    final_result_df = find_stays(conn, params.location, params.from_, params.to_,
+                                 params.holiday_length, params.min_price, params.max_price,
+                                 params.min_review_score, params.max_review_score,
+                                 params.min_reviews, materialized=materialized,
+                                 live_fallback=live_fallback, timings=timings)
+    return rank_stays(final_result_df, params.sort, timings, limit)
+
+
+# Score and sort priced stays, keeping only the top limit of them if given. VM scores are
+# relative to every stay passed in, so stays from several searches must be ranked together
+# rather than separately.
+def rank_stays(final_result_df, sort, timings=None, limit=None):
+    timings = timings or SearchTimings()
+    with timings.stage("vm_score", rows=len(final_result_df)):
+        final_result_df = add_vm_score(final_result_df)
+    with timings.stage("sort"):
+        final_result_df = sort_results(final_result_df, sort, limit)
+    with timings.stage("finish"):
+        return finish_vm_score(final_result_df)
+
+
+# Collapse ranked results to the best stay of each hotel (its first, as they are sorted)
+def best_stay_per_hotel(final_result_df):
+    return final_result_df.drop_duplicates(subset=['city', 'name'])
@@ -0,0 +1,142 @@
+# Search engine that does the pricing, VM scoring and sorting inside SQLite, so only the
+# finished stays (or just the top N of them) ever come back to Python - the raw weekly rows
+# never leave the database. It gives the same results as the pandas engine (booker.pricing
+# and booker.search), which benchmarks/sql_engine.py checks:
+#
+# - The filtered weekly rows are grouped per hotel and check-in day (duplicate rows are
+#   summed, like WeeklyPrices does), then each stay joins its check-in week to the later
+#   weeks it is made of. Required weeks are inner joins, the remainder week a left join.
+# - Week prices are scaled and summed in the same order as WeeklyPrices.stay_prices, and
+#   rounded with Python's round (registered as a SQL function), so prices are identical.
+# - The VM percentile is the same rank formula as percentile_ranks, from RANK() and a
+#   running COUNT() over every stay, before any LIMIT is applied. The other columns are only
+#   read from the hotels table for the stays that make it past the limit.
+# - Each check-in day takes its other columns from the first of its rows, as the pandas
+#   engine does (SQLite takes the bare rating column from the MIN(rowid) row).
+#
+# Ties in the sort key are broken by city, hotel and check-in, where pandas leaves their
+# order unspecified.
+
+import sqlite3
+
+import pandas as pd
+
+from booker.db import HOTEL_COLUMNS, hotels_query_params
+from booker.pricing import update_links, week_factors
+from booker.timing import SearchTimings
+
+
+ORDER_BY = {
+    "Price": "approx_price ASC",
+    "Rating": "rating DESC",
+    "Price & Rating": "vm_score_unrounded DESC",
+}
+
+
+# The query for stays of holiday_length days in n_cities cities. Week price factors are
+# bound as :factor0, :factor1, ... (see query_params) rather than written into the SQL, so
+# they are exactly the floats the pandas engine multiplies by.
+def stays_query(holiday_length, n_cities, sort, limit=None):
+    price = "0.0"
+    joins = []
+    for j, (offset, factor, required) in enumerate(week_factors(holiday_length)):
+        if j == 0:
+            price = f"({price} + d0.price * :factor0)"
+            continue
+        joins.append(f"""{'JOIN' if required else 'LEFT JOIN'} days d{j}
+                          ON d{j}.city = d0.city AND d{j}.name = d0.name
+                          AND d{j}.day = d0.day + {offset}""")
+        price = f"({price} + COALESCE(d{j}.price * :factor{j}, 0.0))"
+
+    cities = ", ".join(f":city{i}" for i in range(n_cities))
+    order_by = f"{ORDER_BY[sort]}, city, name, stay_checkin"
+    outer_order_by = ", ".join("s." + term.strip() for term in order_by.split(","))
+    return f"""WITH days AS (
+                   SELECT city, name, checkin_date, CAST(julianday(checkin_date) AS INTEGER) AS day,
+                          SUM(approx_price) AS price, MIN(rowid) AS id, rating
+                   FROM hotels
+                   WHERE city IN ({cities})
+                   AND checkin_date >= :from_
+                   AND checkin_date <= :to_
+                   AND approx_price BETWEEN :min_price AND :max_price
+                   AND rating >= :min_review_score
+                   AND rating <= :max_review_score
+                   AND reviews >= :min_reviews
+                   GROUP BY city, name, checkin_date
+               ),
+               last AS (
+                   SELECT city, name, MAX(day) AS last_day
+                   FROM days
+                   GROUP BY city, name
+               ),
+               stays AS (
+                   SELECT d0.id, d0.city, d0.name, d0.checkin_date AS stay_checkin, d0.rating,
+                          python_round({price}, 2) AS approx_price
+                   FROM days d0
+                   JOIN last l ON l.city = d0.city AND l.name = d0.name
+                   {' '.join(joins)}
+                   WHERE d0.day + {holiday_length} <= l.last_day
+               ),
+               ranked AS (
+                   SELECT *,
+                          RANK() OVER prices - 1 AS below,
+                          COUNT(*) OVER prices AS at_or_below,
+                          COUNT(*) OVER () AS n
+                   FROM stays
+                   WINDOW prices AS (ORDER BY approx_price)
+               ),
+               scored AS (
+                   SELECT *, 100*(((1 - (below + at_or_below + (below < at_or_below)) * (50.0 / n) * 0.01)
+                                   + rating*0.1)/2) AS vm_score_unrounded
+                   FROM ranked
+                   ORDER BY {order_by}
+                   {'LIMIT ' + str(int(limit)) if limit is not None else ''}
+               )
+               SELECT s.city, s.name, s.stay_checkin, h.checkout_date, s.approx_price, s.rating,
+                      h.reviews, h.hotel_link, s.vm_score_unrounded
+               FROM scored s
+               JOIN hotels h ON h.rowid = s.id
+               ORDER BY {outer_order_by}
+               """
+
+
+def query_params(params, cities):
+    values = dict(zip(['from_', 'to_', 'min_price', 'max_price', 'min_review_score',
+                       'max_review_score', 'min_reviews'],
+                      hotels_query_params(None, params.from_, params.to_, params.min_price,
+                                          params.max_price, params.min_review_score,
+                                          params.max_review_score, params.min_reviews)[1:]))
+    values.update({f"city{i}": city for i, city in enumerate(cities)})
+    values.update({f"factor{j}": float(factor)
+                   for j, (offset, factor, required) in enumerate(week_factors(params.holiday_length))})
+    return values
+
+
+# Ranked stays for a search, in the same form search() returns them. params.location may be a
+# tuple of cities, which are ranked together as search_cities does. With a limit, only the
+# top stays in the chosen sort order are returned.
+def sql_search(conn, params, limit=None, timings=None):
+    if not isinstance(conn, sqlite3.Connection):
+        raise ValueError("The sql engine needs a SQLite database, not a Parquet dataset")
+    if isinstance(params.holiday_length, tuple):
+        raise ValueError("The sql engine searches one holiday length at a time")
+    timings = timings or SearchTimings()
+    cities = params.location if isinstance(params.location, tuple) else (params.location,)
+    conn.create_function("python_round", 2, round, deterministic=True)
+
+    with timings.stage("sql") as stage:
+        query = stays_query(params.holiday_length, len(cities), params.sort, limit)
+        stays = pd.read_sql(query, con=conn, params=query_params(params, cities))
+        stage['stays'] = len(stays)
+
+    with timings.stage("finish"):
+        if stays.empty:
+            return pd.DataFrame(columns=HOTEL_COLUMNS + ['vm_score'])
+        checkin_str = stays.pop('stay_checkin').str[:10].to_numpy()
+        checkout_str = (pd.to_datetime(checkin_str) + pd.Timedelta(days=params.holiday_length)).strftime("%Y-%m-%d").to_numpy()
+        checkout_orig = pd.to_datetime(stays['checkout_date']).dt.strftime("%Y-%m-%d").to_numpy()
+        stays.insert(2, 'checkin_date', checkin_str.astype(object))
+        stays['checkout_date'] = checkout_str.astype(object)
+        stays['hotel_link'] = update_links(stays['hotel_link'], checkin_str, checkout_orig, checkout_str)
+        stays['vm_score'] = round(stays.pop('vm_score_unrounded')).astype(int)
+        return stays
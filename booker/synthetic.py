@@ -0,0 +1,112 @@
+# Generate a synthetic travel.db with the same hotels schema as the release database, for
+# benchmarking and load testing without downloading the real one:
+#
+#     python -m booker.synthetic bench.db --cities 10 --hotels 200 --days 190
+#
+# Every hotel has a 7 night price for (almost) every check-in day, like the scraped data: a
+# per-hotel base price with weekend and seasonal swings, a few missing days, a fixed rating
+# and review count, and a Booking.com style link with the stay's dates in it.
+
+import argparse
+import os
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from booker.db import ensure_indexes
+
+
+HOTELS_TABLE_SQL = """CREATE TABLE hotels (
+                          city TEXT,
+                          name TEXT,
+                          checkin_date TEXT,
+                          checkout_date TEXT,
+                          approx_price REAL,
+                          rating REAL,
+                          reviews INTEGER,
+                          hotel_link TEXT
+                      )"""
+
+CITIES_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "citynames.csv")
+
+
+def city_names(n):
+    try:
+        names = list(pd.read_csv(CITIES_CSV)['Full Name'])
+    except OSError:
+        names = []
+    names += [f"City {i}, Nowhere" for i in range(len(names), n)]
+    return names[:n]
+
+
+# Rows for one city as a dataframe
+def city_hotels(city, hotels, days, start, rng, missing=0.03):
+    hotel = np.repeat(np.arange(hotels), days)
+    day = np.tile(np.arange(days), hotels)
+    checkin = np.datetime64(start, 'D') + day
+    checkout = checkin + 7
+
+    base = rng.lognormal(np.log(90), 0.5, hotels)
+    # 1970-01-01 was a Thursday, so days since the epoch % 7 of 1 and 2 are Fridays and Saturdays
+    weekend = np.where(np.isin(checkin.view('int64') % 7, [1, 2]), 1.15, 1.0)
+    season = 1 + 0.25*np.sin(2*np.pi*day/365)
+    noise = rng.normal(1, 0.05, len(day))
+    price = np.round(base[hotel]*weekend*season*noise, 2)
+
+    slug = [f"{city.split(',')[0].lower().replace(' ', '-')}-hotel-{h}" for h in range(hotels)]
+    checkin_str = np.datetime_as_string(checkin, unit='D')
+    checkout_str = np.datetime_as_string(checkout, unit='D')
+    df = pd.DataFrame({
+        'city': city,
+        'name': np.array([f"Hotel {h:04d}" for h in range(hotels)])[hotel],
+        'checkin_date': checkin_str,
+        'checkout_date': checkout_str,
+        'approx_price': price,
+        'rating': np.round(rng.uniform(6.0, 9.9, hotels), 1)[hotel],
+        'reviews': rng.integers(0, 8000, hotels)[hotel],
+        'hotel_link': [f"https://www.booking.com/hotel/xx/{slug[h]}.html?checkin={cin}&checkout={cout}&group_adults=1"
+                       for h, cin, cout in zip(hotel, checkin_str, checkout_str)],
+    })
+    return df[rng.random(len(df)) >= missing]
+
+
+def generate_db(path, cities=10, hotels=100, days=190, start=None, seed=0, index=True):
+    start = start or date.today()
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(HOTELS_TABLE_SQL)
+            for city in city_names(cities):
+                df = city_hotels(city, hotels, days, start, rng)
+                conn.executemany("INSERT INTO hotels VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 df.itertuples(index=False, name=None))
+    finally:
+        conn.close()
+
+    if index:
+        ensure_indexes(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic travel.db")
+    parser.add_argument("db", help="output path (overwritten)")
+    parser.add_argument("--cities", type=int, default=10)
+    parser.add_argument("--hotels", type=int, default=100, help="hotels per city")
+    parser.add_argument("--days", type=int, default=190, help="check-in days per hotel")
+    parser.add_argument("--start", type=date.fromisoformat, help="first check-in (default: today)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-index", dest="index", action="store_false",
+                        help="leave out the search index")
+    args = parser.parse_args(argv)
+    generate_db(args.db, args.cities, args.hotels, args.days, args.start, args.seed, args.index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Per-stage timings for a search, to see where a slow one spends its time.
+#
+#     timings = SearchTimings(city="Madrid, Spain", nights=7)
+#     with timings:
+#         with timings.stage("query") as stage:
+#             df = ...
+#             stage["rows"] = len(df)
+#
+# Each stage records how long it took in ms plus whatever counts the code fills in (rows read,
+# hotels, windows priced, ...). A streamed search runs the same stage once per batch, and
+# summary() adds them up. Leaving the with block logs the whole search as one JSON line on
+# the "booker.timing" logger, for shipping to a log pipeline (log_to_stderr turns it on).
+#
+# Set BOOKER_PROFILE=cprofile (or pyinstrument, if installed) to also profile each search.
+# Profiles are written to BOOKER_PROFILE_DIR (default: the temp directory) and the file name
+# is included in the log line - open .prof files with snakeviz or pstats, .html in a browser.
+
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("booker.timing")
+
+PROFILE_ENV = "BOOKER_PROFILE"
+PROFILE_DIR_ENV = "BOOKER_PROFILE_DIR"
+
+
+def log_to_stderr():
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def ms_since(start):
+    return round((time.perf_counter() - start)*1000, 3)
+
+
+# cProfile or pyinstrument profiler picked by BOOKER_PROFILE, or None
+class Profiler:
+    def __init__(self, kind):
+        self.kind = kind
+        self.profiler = None
+
+    @classmethod
+    def from_env(cls):
+        kind = os.environ.get(PROFILE_ENV, "").lower()
+        return cls(kind) if kind in ("cprofile", "pyinstrument") else None
+
+    def start(self):
+        try:
+            if self.kind == "pyinstrument":
+                import pyinstrument
+                self.profiler = pyinstrument.Profiler()
+                self.profiler.start()
+            else:
+                import cProfile
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        except (ImportError, ValueError, RuntimeError):
+            # Not installed, or another session's search is already being profiled
+            self.profiler = None
+
+    # Stop and save the profile, returning its path
+    def stop(self):
+        if self.profiler is None:
+            return None
+        directory = os.environ.get(PROFILE_DIR_ENV) or tempfile.gettempdir()
+        stem = os.path.join(directory, f"booker-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{id(self)}")
+        if self.kind == "pyinstrument":
+            self.profiler.stop()
+            path = stem + ".html"
+            with open(path, "w") as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            path = stem + ".prof"
+            self.profiler.dump_stats(path)
+        return path
+
+
+class SearchTimings:
+    def __init__(self, event="search", **fields):
+        self.event = event
+        self.fields = fields
+        self.stages = []
+        self.total_ms = None
+        self.profile = None
+        self._start = None
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name, **counts):
+        record = dict(stage=name, **counts)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = ms_since(start)
+            self.stages.append(record)
+
+    # Stages timed somewhere else, eg. in a worker process
+    def extend(self, stages, **counts):
+        self.stages.extend(dict(record, **counts) for record in stages)
+
+    # {stage: {'ms': total, 'calls': n, <count>: total, ...}} in order of first appearance
+    def summary(self):
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'ms': 0.0, 'calls': 0})
+            total['calls'] += 1
+            for key, value in record.items():
+                if key != 'stage' and isinstance(value, (int, float)):
+                    total[key] = total.get(key, 0) + value
+        for total in totals.values():
+            total['ms'] = round(total['ms'], 3)
+        return totals
+
+    def as_dict(self):
+        record = {'event': self.event, **self.fields, 'total_ms': self.total_ms,
+                  'stages': self.summary()}
+        if self.profile:
+            record['profile'] = self.profile
+        return record
+
+    def __enter__(self):
+        self._profiler = Profiler.from_env()
+        if self._profiler is not None:
+            self._profiler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total_ms = ms_since(self._start)
+        if self._profiler is not None:
+            self.profile = self._profiler.stop()
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        logger.info(json.dumps(self.as_dict(), default=str))
@@ -0,0 +1,384 @@
+# Saved searches, re-checked whenever a new travel.db is installed to report price drops:
+#
+#     python -m booker.watchlist add --city "Madrid, Spain" --from 2025-07-01 --to 2025-08-31 --nights 7
+#     python -m booker.watchlist list
+#     python -m booker.watchlist remove 3
+#     python -m booker.watchlist refresh --manifest https://example.com/releases/manifest.json
+#
+# Saved searches are kept in their own SQLite file (watchlist.db) rather than in travel.db,
+# which searches open read-only and a full download replaces. Each belongs to an owner - the
+# app keeps every browser's searches under its own id (in the page's URL), the command line's
+# are under "" unless --owner says otherwise. Each one remembers the top TOP_N stays it last
+# found, its cheapest price and best VM score, the release version it was evaluated against,
+# and a digest of every city/month chunk of hotels rows it read (the same digests
+# booker.delta checks updates with).
+#
+# refresh (run after an update - with --manifest it applies the update itself) re-runs only
+# the searches (of every owner) that read a chunk that changed. After a delta update the
+# chunks it changed are known, so searches evaluated against the version it started from
+# aren't checked any further; the others (and everything after a full download) have the
+# digests of their chunks worked out and compared. For the searches re-run it reports the
+# stays from their last top results that are now cheaper, and a new cheapest price or best VM
+# score. The rest are left as they were without being searched again.
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+from urllib.parse import quote
+
+import pandas as pd
+
+from booker.cli import SORTS, add_search_arguments, search_params
+from booker.db import open_db
+from booker.delta import CHUNK_QUERY, rows_digest, update_db
+from booker.download import DB_PATH, DB_URL, download_db, read_meta
+from booker.multi import search_cities
+from booker.parquet import is_dataset, months_between, open_source
+from booker.search import SearchParams, search
+
+
+WATCHLIST_PATH = "watchlist.db"
+
+# Top stays remembered for each saved search
+TOP_N = 20
+
+STAY_KEY = ['city', 'name', 'checkin_date', 'checkout_date']
+TOP_COLUMNS = STAY_KEY + ['nights', 'approx_price', 'rating', 'vm_score']
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS saved_searches (
+                id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL DEFAULT '',
+                name TEXT,
+                params TEXT NOT NULL,
+                created TEXT NOT NULL,
+                evaluated TEXT,
+                version TEXT,
+                digests TEXT,
+                top TEXT,
+                report TEXT,
+                UNIQUE (owner, params)
+            )"""
+
+
+# The table is only created when a search is saved - reading the saved searches doesn't write
+def connect(path=WATCHLIST_PATH, create=False):
+    conn = sqlite3.connect(path)
+    if create:
+        conn.execute(SCHEMA)
+    return conn
+
+
+# SearchParams to and from JSON (the saved form is also what makes a search unique)
+def params_to_json(params):
+    values = params._asdict()
+    values.update(from_=str(params.from_), to_=str(params.to_))
+    return json.dumps(values)
+
+
+def params_from_json(text):
+    values = json.loads(text)
+    for name in ('location', 'holiday_length'):
+        if isinstance(values[name], list):
+            values[name] = tuple(values[name])
+    values.update(from_=date.fromisoformat(values['from_']), to_=date.fromisoformat(values['to_']))
+    return SearchParams(**values)
+
+
+def cities_of(params):
+    return params.location if isinstance(params.location, tuple) else (params.location,)
+
+
+# (city, month) chunks of hotels rows a search reads
+def search_chunks(params):
+    return [(city, month) for city in cities_of(params) for month in months_between(params.from_, params.to_)]
+
+
+def chunk_key(city, month):
+    return f"{city}|{month}"
+
+
+# Release version of the database (see booker.delta), None if it wasn't installed from one
+def release_version(db_path):
+    return (read_meta(db_path + ".json") or {}).get("version")
+
+
+# {"city|month": digest} of the chunks, read from the database. None for a Parquet dataset,
+# whose searches are then re-run on every refresh.
+def chunk_digests(db_path, chunks):
+    if is_dataset(db_path):
+        return None
+    conn = open_db(db_path)
+    try:
+        return {chunk_key(*chunk): rows_digest(conn.execute(CHUNK_QUERY, chunk)) for chunk in chunks}
+    finally:
+        conn.close()
+
+
+# What to remember of a search's ranked results: the top stays, the cheapest price and the
+# best VM score
+def summarize(results):
+    if results.empty:
+        return {"stays": [], "best_price": None, "best_vm_score": None}
+    top = results.head(TOP_N)
+    top = top[[column for column in TOP_COLUMNS if column in top.columns]]
+    return {"stays": json.loads(plain_stays(top).to_json(orient='records')),
+            "best_price": round(float(results['approx_price'].min()), 2),
+            "best_vm_score": int(results['vm_score'].max())}
+
+
+# Dates as "%Y-%m-%d" strings and prices to the penny, whether results are compact
+# (booker.results, where prices are float32) or not
+def plain_stays(stays):
+    stays = stays.copy()
+    for column in ('checkin_date', 'checkout_date'):
+        stays[column] = pd.to_datetime(stays[column]).dt.strftime("%Y-%m-%d")
+    stays['approx_price'] = stays['approx_price'].astype(float).round(2)
+    return stays
+
+
+# Changes since the summary a search was last evaluated to: stays of its top results now
+# cheaper, and a lower cheapest price or higher best VM score
+def compare(previous, results, summary):
+    report = {"price_drops": [], "best_price": None, "best_vm_score": None}
+    if previous["stays"] and not results.empty:
+        before = pd.DataFrame(previous["stays"])[STAY_KEY + ['approx_price']]
+        now = plain_stays(results[STAY_KEY + ['approx_price']])
+        stays = before.merge(now, on=STAY_KEY, suffixes=('_before', ''))
+        dropped = stays[stays['approx_price'] < stays['approx_price_before']]
+        report["price_drops"] = [
+            dict(zip(STAY_KEY, key), old_price=float(old), new_price=float(new))
+            for *key, old, new in dropped[STAY_KEY + ['approx_price_before', 'approx_price']].itertuples(index=False)
+        ]
+    if summary["best_price"] is not None:
+        if previous["best_price"] is None or summary["best_price"] < previous["best_price"]:
+            report["best_price"] = [previous["best_price"], summary["best_price"]]
+        if previous["best_vm_score"] is None or summary["best_vm_score"] > previous["best_vm_score"]:
+            report["best_vm_score"] = [previous["best_vm_score"], summary["best_vm_score"]]
+    return report
+
+
+# Save a search, returning its id (the existing one if the owner already saved it). Its
+# current results can be passed in along with the database they came from, so it needn't be
+# searched again on the next refresh.
+def save_search(params, name=None, results=None, db_path=None, owner="", path=WATCHLIST_PATH):
+    evaluated = version = digests = top = None
+    if results is not None and db_path is not None:
+        evaluated = datetime.now().isoformat(timespec='seconds')
+        version = release_version(db_path)
+        digests = chunk_digests(db_path, search_chunks(params))
+        top = json.dumps(summarize(results))
+    conn = connect(path, create=True)
+    try:
+        with conn:
+            conn.execute("""INSERT INTO saved_searches
+                                (owner, name, params, created, evaluated, version, digests, top)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (owner, params) DO NOTHING""",
+                         (owner, name, params_to_json(params), datetime.now().isoformat(timespec='seconds'),
+                          evaluated, version, digests and json.dumps(digests), top))
+        return conn.execute("SELECT id FROM saved_searches WHERE owner = ? AND params = ?",
+                            (owner, params_to_json(params))).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def remove_search(id, owner="", path=WATCHLIST_PATH):
+    if not os.path.exists(path):
+        return False
+    conn = connect(path)
+    try:
+        with conn:
+            return conn.execute("DELETE FROM saved_searches WHERE id = ? AND owner = ?",
+                                (id, owner)).rowcount > 0
+    finally:
+        conn.close()
+
+
+# Every saved search (or just the owner's) as a dict, with its params, digests, top results
+# and last report decoded. The file is only read.
+def saved_searches(path=WATCHLIST_PATH, owner=None):
+    if not os.path.exists(path):
+        return []
+    conn = sqlite3.connect("file:{0}?mode=ro".format(quote(os.path.abspath(path))), uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        if owner is None:
+            rows = conn.execute("SELECT * FROM saved_searches ORDER BY id").fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM saved_searches WHERE owner = ? ORDER BY id", (owner,)).fetchall()
+    finally:
+        conn.close()
+    saved = []
+    for row in rows:
+        entry = dict(row)
+        entry["params"] = params_from_json(row["params"])
+        for column in ('digests', 'top', 'report'):
+            entry[column] = json.loads(row[column]) if row[column] else None
+        saved.append(entry)
+    return saved
+
+
+def label(entry):
+    if entry["name"]:
+        return entry["name"]
+    params = entry["params"]
+    return f"{' + '.join(cities_of(params))}, {params.from_} to {params.to_}"
+
+
+def run_saved_search(params, conn, db_path, workers):
+    if isinstance(params.location, tuple):
+        return search_cities(params, list(params.location), db_path, workers)
+    return search(params, conn)
+
+
+# Re-run the saved searches that read rows changed since they were last evaluated, updating
+# what's remembered of them. update is what booker.delta.update_db did to the database, if
+# it's just been run. Returns [(saved search, report)] for the searches re-run - the report is
+# None for one evaluated for the first time.
+def refresh(db_path, path=WATCHLIST_PATH, workers=None, update=None):
+    saved = saved_searches(path)
+    version = release_version(db_path)
+
+    # Searches evaluated against either end of a delta update only read changed rows if they
+    # read a chunk it changed. The rest need the digests of their chunks comparing.
+    stale, unchanged, check = [], [], []
+    for entry in saved:
+        if entry["top"] is None:
+            stale.append(entry)
+        elif (update is not None and update.changed is not None and entry["version"] is not None
+              and entry["version"] in (update.old_version, update.version)):
+            read = set(search_chunks(entry["params"]))
+            if entry["version"] == update.old_version and read & update.changed:
+                stale.append(entry)
+            else:
+                unchanged.append(entry)
+        else:
+            check.append(entry)
+
+    chunks = sorted({chunk for entry in stale + check for chunk in search_chunks(entry["params"])})
+    current = chunk_digests(db_path, chunks) if chunks else {}
+    for entry in check:
+        keys = [chunk_key(*chunk) for chunk in search_chunks(entry["params"])]
+        if (entry["digests"] is None or current is None
+                or any(entry["digests"].get(key) != current[key] for key in keys)):
+            stale.append(entry)
+        else:
+            unchanged.append(entry)
+
+    # Searches whose rows didn't change are as good as evaluated against this version
+    moved = [entry["id"] for entry in unchanged if entry["version"] != version]
+    if moved:
+        store = connect(path)
+        try:
+            with store:
+                store.executemany("UPDATE saved_searches SET version = ? WHERE id = ?",
+                                  [(version, id) for id in moved])
+        finally:
+            store.close()
+
+    reports = []
+    conn = open_source(db_path) if stale else None
+    try:
+        for entry in sorted(stale, key=lambda entry: entry["id"]):
+            keys = [chunk_key(*chunk) for chunk in search_chunks(entry["params"])]
+            digests = current and {key: current[key] for key in keys}
+            results = run_saved_search(entry["params"], conn, db_path, workers)
+            summary = summarize(results)
+            report = compare(entry["top"], results, summary) if entry["top"] else None
+            store = connect(path)
+            try:
+                with store:
+                    store.execute("""UPDATE saved_searches
+                                     SET evaluated = ?, version = ?, digests = ?, top = ?, report = ?
+                                     WHERE id = ?""",
+                                  (datetime.now().isoformat(timespec='seconds'), version,
+                                   digests and json.dumps(digests), json.dumps(summary),
+                                   report and json.dumps(report), entry["id"]))
+            finally:
+                store.close()
+            reports.append((entry, report))
+    finally:
+        if conn is not None:
+            conn.close()
+    return reports
+
+
+def describe_report(report):
+    if report is None:
+        return "first results saved"
+    changes = []
+    if report["price_drops"]:
+        changes.append(f"{len(report['price_drops'])} stays cheaper")
+    if report["best_price"]:
+        old, new = report["best_price"]
+        changes.append(f"cheapest £{new:,.2f}" + (f" (was £{old:,.2f})" if old is not None else ""))
+    if report["best_vm_score"]:
+        old, new = report["best_vm_score"]
+        changes.append(f"best VM score {new}" + (f" (was {old})" if old is not None else ""))
+    return ", ".join(changes) or "no price drops"
+
+
+def print_report(reports, total):
+    print(f"Re-ran {len(reports)} of {total} saved searches, the rest read no changed rows")
+    for entry, report in reports:
+        print(f"\n[{entry['id']}] {label(entry)}: {describe_report(report)}")
+        for stay in (report or {}).get("price_drops", []):
+            print(f"    {stay['name']} ({stay['city']}), {stay['checkin_date']} to {stay['checkout_date']}: "
+                  f"£{stay['old_price']:,.2f} -> £{stay['new_price']:,.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m booker.watchlist",
+                                     description="Saved searches and their price drops")
+    parser.add_argument("--watchlist", default=WATCHLIST_PATH, help="saved searches database")
+    parser.add_argument("--owner", default="", help="whose saved searches to add, list or remove "
+                                                    "(the app's watchlist id, from its URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="save a search")
+    add_search_arguments(add_parser)
+    add_parser.add_argument("--name")
+
+    commands.add_parser("list", help="show the saved searches and their last changes")
+
+    remove_parser = commands.add_parser("remove", help="forget a saved search")
+    remove_parser.add_argument("id", type=int)
+
+    refresh_parser = commands.add_parser("refresh", help="re-run everyone's searches affected by a new travel.db")
+    refresh_parser.add_argument("--db", help="use this travel.db instead of the downloaded release")
+    refresh_parser.add_argument("--manifest", help="update travel.db from this releases manifest.json first "
+                                                   "(see booker.delta)")
+    refresh_parser.add_argument("--workers", type=int,
+                                help="processes for multi-city searches (default: one per CPU)")
+
+    args = parser.parse_args(argv)
+    if args.command == "add":
+        params = search_params(args)
+        if len(args.cities) > 1:
+            params = params._replace(location=tuple(dict.fromkeys(args.cities)))
+        print(save_search(params, args.name, owner=args.owner, path=args.watchlist))
+    elif args.command == "list":
+        for entry in saved_searches(args.watchlist, args.owner):
+            params = entry["params"]
+            sort = next(name for name, option in SORTS.items() if option == params.sort)
+            status = describe_report(entry["report"]) if entry["evaluated"] else "not run yet"
+            nights = params.holiday_length
+            nights = f"{nights[0]}-{nights[1]}" if isinstance(nights, tuple) else nights
+            print(f"[{entry['id']}] {label(entry)}, {nights} nights, by {sort}: {status}")
+    elif args.command == "remove":
+        if not remove_search(args.id, args.owner, args.watchlist):
+            raise SystemExit(f"No saved search {args.id}")
+    else:
+        update = None
+        if args.manifest:
+            update = update_db(args.manifest, args.db or DB_PATH)
+            db_path = update.path
+        else:
+            db_path = args.db or download_db(DB_URL, DB_PATH)
+        print_report(refresh(db_path, args.watchlist, args.workers, update), len(saved_searches(args.watchlist)))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,63 +2,117 @@
 
 import streamlit as st
 import pandas as pd
-from scipy import stats
 from datetime import date, timedelta
-import sqlite3
-import io
-import requests
+import os
+import secrets
+from booker.cache import ResultCache
+from booker.cities import load_cities
+from booker.db import ConnectionPool, db_version
+from booker.delta import update_db
+from booker.download import DB_PATH, DB_URL, download_db
+from booker.export import EXPORT_FORMATS, export_bytes, export_file_name
+from booker.jobs import JobQueue, search_job
+from booker.multi import city_pool, search_cities
+from booker.parquet import ParquetStore, is_dataset
+from booker.results import compact_results, expand_results
+from booker.search import SORT_OPTIONS, SearchParams, best_stay_per_hotel, search
+from booker.timing import SearchTimings, log_to_stderr
+from booker.watchlist import describe_report, label, save_search, saved_searches
 today = date.today()
 
-# Get Database
-DB_URL = "https://github.com/jake-ockerby/Booking-Tool/releases/download/v1.0.2/travel.db"
-DB_PATH = "travel.db"
+# Only a page of results is sent to the browser at a time (the download has all of them), and
+# only the top stays are shown while a search is running
+PAGE_SIZES = (50, 100, 250, 1000)
+PREVIEW_ROWS = 100
 
+# Searches run in the background on this many threads, and finished ones are kept (for any
+# session making the same search) for this many seconds
+JOB_WORKERS = 4
+JOB_RETAIN = 30*60
+
+# Every search is logged as a JSON line with its stage timings. The debug expander (at the
+# bottom of the page) is shown with BOOKER_DEBUG=1 or ?debug=1 in the URL.
+log_to_stderr()
+debug = bool(os.environ.get("BOOKER_DEBUG")) or "debug" in st.query_params
+
+# Each browser's saved searches (see booker.watchlist) are kept under a random id, put in the
+# URL when the first is saved - so they come back with the page's link, and no one else's show
+watchlist_id = st.query_params.get("watchlist")
+
+# BOOKER_DB=<path> uses that travel.db as it is, eg. a synthetic one for load testing
+LOCAL_DB = os.environ.get("BOOKER_DB")
+
+# BOOKER_PARQUET=<directory or URL> searches a Parquet dataset (see booker.parquet) instead of
+# travel.db, which then isn't downloaded - only the partitions each search needs are read
+PARQUET_DATA = os.environ.get("BOOKER_PARQUET")
+
+# BOOKER_MANIFEST=<URL of a releases manifest.json> keeps travel.db up to date with delta
+# updates (see booker.delta) rather than downloading the whole of DB_URL again
+MANIFEST_URL = os.environ.get("BOOKER_MANIFEST")
+
+# Only fetched when the local copy is missing or out of date (once per process, before any
+# connection is opened, as updates are applied to the file in place)
+@st.cache_resource
+def get_db(url):
+    if LOCAL_DB or PARQUET_DATA:
+        return LOCAL_DB or PARQUET_DATA
+    if MANIFEST_URL:
+        return update_db(MANIFEST_URL, DB_PATH).path
+    return download_db(url, DB_PATH)
+
+# One pool of read-only connections shared by every session (a Parquet dataset is shared as is)
 @st.cache_resource
-def download_db(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
-    response = requests.get(url, stream=True, headers=headers, allow_redirects=True)
-    response.raise_for_status()
-
-    with open(DB_PATH, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-            
-    return DB_PATH
+def get_pool():
+    db_file = get_db(DB_URL)
+    return ParquetStore(db_file) if is_dataset(db_file) else ConnectionPool(db_file)
 
 def get_connection():
-    db_file = download_db(DB_URL)
-    conn = sqlite3.connect(db_file)
-    return conn
-
-
-# Cache to prevent computation on every rerun
-# Write results to excel file
-@st.cache_data
-def convert_df(df):
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine="xlsxwriter",
-                            engine_kwargs={'options': {'strings_to_urls': False}})
-    
-    df = df.copy()
-    if "hotel_link" in df.columns:
-        df["hotel_link"] = df["hotel_link"].astype(str)
-    
-    df.to_excel(writer, index=False)
-    writer.close()
-    data_bytes = output.getvalue()
-    return data_bytes
-
-# Read in cities and remove any that are not desired
-cities = pd.read_csv('citynames.csv')
-cities_list = sorted(list(cities['Full Name']))
-exclude = ['Andorra', 'San Marino', 'Monaco', 'Jersey', 'Guernsey', 'Isle of Man',
-           'Liechtenstein', 'Sector 3', 'Syria', 'Luxembourg', 'Cyprus']
-for item in exclude:
-    cities_list = [city for city in cities_list if item not in city]
-    
-cities_tuple = tuple(cities_list)
+    return get_pool().connection()
+
+# Worker processes for multi-city searches, started once and shared by every session
+@st.cache_resource
+def get_city_pool():
+    return city_pool(get_db(DB_URL))
+
+# Search results shared by every session
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+
+# Background search jobs shared by every session, kept for half an hour once finished
+@st.cache_resource
+def get_jobs():
+    return JobQueue(workers=JOB_WORKERS, retain=JOB_RETAIN)
+
+
+# Results of a search from its finished job or the shared cache, searching again if they
+# have been evicted from both
+def get_results(params):
+    version = db_version(get_db(DB_URL))
+    job = get_jobs().get((params, version))
+    if job is not None and job.status == "done":
+        return job.result
+    if isinstance(params.location, tuple):
+        compute = lambda: search_cities(params, params.location, get_db(DB_URL), executor=get_city_pool())
+    else:
+        compute = lambda: search(params, get_connection())
+    return get_result_cache().get_or_compute(params, lambda: compact_results(compute()), version)
+
+# Cache to prevent computation on every rerun. Keyed on the search rather than the results
+# themselves (Streamlit doesn't hash arguments starting with an underscore), and only run
+# when a download is asked for
+@st.cache_data(max_entries=16, ttl=30*60)
+def convert_df(_df, params, version, export_format):
+    return export_bytes(_df, export_format)
+
+# Cities to choose from (minus any that are not desired), read once rather than on every rerun.
+# No spinner, as nothing may be drawn before set_page_config
+@st.cache_resource(show_spinner=False)
+def get_cities():
+    return load_cities()
+
+cities_tuple = get_cities()
 
 st.set_page_config(page_title="Cheeky Booker", layout="centered")
 
@@ -89,6 +143,8 @@ with st.expander("Instructions"):
     **Hotel Location**: Type the name of the city where you want to find a hotel.
     - **Note**: There are 115 cities to select from across Europe (including Turkey).
     More cities may be included in future.
+    - Switch on **Compare several cities** to search the same window across a number of cities
+      at once, and rank the results together.
     """)
 
     st.markdown("### 2. Choose Your Travel Window")
@@ -101,6 +157,8 @@ with st.expander("Instructions"):
     st.markdown("### 3. Set Holiday Duration")
     st.write("""
     - Use the slider to pick how many days you want the holiday to last (up to 30 days).
+    - Switch on **Flexible duration** to pick a range instead (eg. 5 to 8 days). Every length in
+      the range is searched at once, and the results gain a **nights** column.
     """)
 
     st.markdown("### 4. (Optional) Add Filters")
@@ -115,7 +173,9 @@ with st.expander("Instructions"):
     st.markdown("### 5. Search")
     st.write("""
     - Click the **Search** button.
-    - The app will search for hotels over the selected window and holiday duration.
+    - The app will search for hotels over the selected window and holiday duration. The search runs in
+      the background, showing the best stays found so far, and carries on if you change the filters
+      in the meantime.
     - If no location is provided, a warning will be shown.
     """)
 
@@ -123,7 +183,10 @@ with st.expander("Instructions"):
     st.write("""
     - After the search completes, you’ll see a table of results with links to **hotel pages** (Booking.com)
     - Prices shown are per person per night, and are approximates only.
-    - Click **Download Results** to save the data as an Excel spreadsheet.
+    - Results are shown a page at a time - use **Page** and **Rows per page** to move through them,
+      or switch on **Best stay per hotel** to only see each hotel's best stay.
+    - Pick a format (Excel, CSV or Parquet), click **Prepare Download**, then **Download Results** to
+      save the data. The download always has every stay.
     """)
     
     st.markdown("### Feedback")
@@ -134,7 +197,12 @@ st.divider()
 
 # ----------- Location ------------
 st.markdown("### Location")
-location = st.selectbox("Hotel Location:", cities_tuple, index=None)
+multi_city = st.toggle("Compare several cities")
+if multi_city:
+    locations = st.multiselect("Hotel Locations:", cities_tuple)
+else:
+    location = st.selectbox("Hotel Location:", cities_tuple, index=None)
+    locations = [location] if location else []
 
 st.divider()
 
@@ -149,7 +217,13 @@ with col5:
 
 # ----------- Holiday Length ------------
 st.markdown("### Holiday Duration")
-holiday_length = st.slider("Holiday Duration (Days):", 1, min((to_ - from_).days, 30))
+max_length = min((to_ - from_).days, 30)
+if st.toggle("Flexible duration"):
+    # Every length in the range is searched at once and ranked together
+    shortest, longest = st.slider("Holiday Duration (Days):", 1, max_length, (1, max_length))
+    holiday_length = shortest if shortest == longest else (shortest, longest)
+else:
+    holiday_length = st.slider("Holiday Duration (Days):", 1, max_length)
 
 # ----------- Advanced Filters ------------
 st.markdown("### Additional Filters")
@@ -172,149 +246,137 @@ with st.expander("Click to add filters"):
     min_reviews = st.number_input("Min. # of reviews:", min_value=0, max_value=100000)
 
     st.markdown("#### Sort Options")
-    sort = st.selectbox("Sort By:", ("Price", "Rating", "Price & Rating"))
+    sort = st.selectbox("Sort By:", SORT_OPTIONS)
 
 
 st.divider()
 
+# Configure link column to allow hyperlinks
+column_config = {
+"hotel_link": st.column_config.LinkColumn("hotel_link", display_text="Hotel Link")
+}
+
 # ----------- Search Button ------------
 if st.button("Search", type="primary"):
-    # If hotel location is non-empty, run the full booking search
-    if location:
-        with st.spinner("Bear with me ...", show_time=True):
-            # Connect to database and store raw results in a dataframe
-            conn = get_connection()
-            query = f"""SELECT *
-                        FROM hotels
-                        WHERE city = '{location}'
-                        AND checkin_date >= '{from_}'
-                        AND checkin_date <= '{to_}'
-                        AND approx_price BETWEEN {min_price} AND {max_price}
-                        AND rating >= {min_review_score}
-                        AND rating <= {max_review_score}
-                        AND reviews >= {min_reviews}
-                        
-                        ORDER BY name, checkin_date
-                        """
-            result_df = pd.read_sql(query, con=conn)
-            result_df['checkin_date'] = pd.to_datetime(result_df['checkin_date']).dt.date
-            result_df['checkout_date'] = pd.to_datetime(result_df['checkout_date']).dt.date
-            
-            # Raw results are 7 days at a time - eg. 18th - 25th March, 19th - 26th March, etc.
-            # We want results for any holiday length the user enters on the app. This loop cycles
-            # over each hotel name and calculates an approx. price.
-            hotel_names = list(result_df['name'].unique())
-            final_results = []
-            for name in hotel_names:
-                # Create a window from first and last dates the hotel appears
-                hotel_df = result_df[result_df['name'] == name].copy()
-                first_day = list(hotel_df['checkin_date'])[0]
-                last_day = list(hotel_df['checkin_date'])[-1]
-                window = (last_day - first_day).days - holiday_length + 1
-                # If window is < 1, the holiday length is larger than the dates the hotel is
-                # available for. We need to skip over these.
-                if window >= 1:
-                    for i in range(window):
-                        # Cycle over the window
-                        checkin = first_day + timedelta(days=i)
-                        checkout = checkin + timedelta(days=holiday_length)
-                        holiday = hotel_df[(hotel_df['checkin_date'] >= checkin) & (hotel_df['checkin_date'] <= checkout)].copy()
-                        
-                        # If holiday length is < 1 week, use this week's price as the approx. price.
-                        # Otherwise we want to collect prices at each week end, and adjust the price
-                        # calculation for any remainder.
-                        weeks = int(holiday_length/7) + 1
-                        weekly_results = []
-                        for j in range(weeks):
-                            week_end = checkin + timedelta(days=(j+1)*7)
-                            week_result = holiday[holiday['checkout_date'] == week_end].copy()
-                            if weeks != 1:
-                                if week_end > checkout:
-                                    days_over = (week_end - checkout).days
-                                    week_result['approx_price'] = week_result['approx_price']*((7-days_over)/holiday_length)
-                                else:
-                                    week_result['approx_price'] = week_result['approx_price']*(7/holiday_length)
-                                
-                            weekly_results.append(week_result)
-                       
-                        # Workaround for if we only have 1 result (< 1 week), as we skip over any week-ends
-                        # that are missing (leads to inconsitent results)
-                        check_missing = [len(x) for x in weekly_results]
-                        if len(check_missing) == 1:
-                            check_missing.append(0)
-                        
-                        # If there are no missings, sum over the collected prices (works as an average due to scaling)
-                        if 0 not in check_missing[:-1]:
-                            weekly_df = pd.concat(weekly_results)
-                            avg_price = round(sum(weekly_df['approx_price']), 2)
-                            
-                            # Everything else being constant, we are ok to take the first row, add in our calculated
-                            # price, and change the date information
-                            holiday_result = weekly_df.iloc[[0]].copy()
-                            
-                            checkin_orig = holiday_result['checkin_date'].values[0].strftime("%Y-%m-%d")
-                            checkout_orig = holiday_result['checkout_date'].values[0].strftime("%Y-%m-%d")
-                            checkin_str = checkin.strftime("%Y-%m-%d")
-                            checkout_str = checkout.strftime("%Y-%m-%d")
-                            
-                            holiday_result['checkin_date'] = checkin_str
-                            holiday_result['checkout_date'] = checkout_str
-                            holiday_result['hotel_link'] = holiday_result['hotel_link'].apply(lambda x:\
-                            x.replace("checkin={0}&checkout={1}".format(checkin_orig, checkout_orig),
-                                    "checkin={0}&checkout={1}".format(checkin_str, checkout_str)
-                                    ))
-                            holiday_result['approx_price'] = avg_price
-                            
-                            # Add the results of each hotel to the list
-                            final_results.append(holiday_result)
-            
-            # Build the final dataframe from the list of all results
-            final_result_df = pd.concat(final_results)
-            
-            
-            # ---------------------------------------------- VM Calculation --------------------------------------------
-            # Scale columns to be within a range of 0 and 1 - price is represented as the percentile value over all prices
-            final_result_df['price_percentile'] = stats.percentileofscore(final_result_df['approx_price'], final_result_df['approx_price'])*0.01
-            final_result_df['rating_scaled'] = final_result_df['rating']*0.1
-            
-            # Build VM (Value for Money) score
-            final_result_df['vm_score_unrounded'] = 100*(((1-final_result_df['price_percentile'])+final_result_df['rating_scaled'])/2)
-            # ----------------------------------------------------------------------------------------------------------
-            
-            
-            
-            # Sort final results based on user input
-            if sort == 'Price & Rating':
-                final_result_df = final_result_df.sort_values(by='vm_score_unrounded', ascending=False)
-                
-            elif sort == 'Price':
-                final_result_df = final_result_df.sort_values(by='approx_price', ascending=True)
-            
-            else:
-                final_result_df = final_result_df.sort_values(by='rating', ascending=False)
-        
-            # Apply rounding to VM score and drop scaled columns
-            final_result_df['vm_score'] = round(final_result_df['vm_score_unrounded'])
-            final_result_df['vm_score'] = final_result_df['vm_score'].astype(int)
-            final_result_df.drop('price_percentile', axis=1, inplace=True)
-            final_result_df.drop('rating_scaled', axis=1, inplace=True)
-            final_result_df.drop('vm_score_unrounded', axis=1, inplace=True)
-                    
-                    
-        st.success("Search complete!")
-
-        # Configure link column to allow hyperlinks
-        column_config = {
-        "hotel_link": st.column_config.LinkColumn("hotel_link", display_text="Hotel Link")
-        }
-        # Show the dataframe in the app
-        st.dataframe(final_result_df, column_config=column_config, hide_index=True)
-
-        # Convert to excel and show the download button
-        excel = convert_df(final_result_df)
-        st.download_button("Download Results", data=excel, file_name="search_results.xlsx", type="primary")
+    # If hotel location is non-empty, start the search in the background (unless an identical
+    # search, by any session, is already cached or running)
+    if locations:
+        params = SearchParams(tuple(locations) if multi_city else location, from_, to_, holiday_length,
+                              min_price, max_price, min_review_score, max_review_score, min_reviews, sort)
+        version = db_version(get_db(DB_URL))
+        if get_result_cache().get(params, version) is None:
+            get_jobs().submit((params, version), search_job, params, get_pool(), get_db(DB_URL),
+                              get_city_pool(), get_result_cache(), version, PREVIEW_ROWS)
+        st.session_state['search'] = params
+        st.session_state['page'] = 1
+        st.session_state['announce'] = True
 
     # Else display a warning
     else:
+        st.session_state.pop('search', None)
         st.warning("Please enter a destination")
-            
+
+# Progress of a running search, checked every half second without rerunning the whole page,
+# until it finishes and the page is rerun to show the results
+@st.fragment(run_every=0.5)
+def show_progress(key):
+    job = get_jobs().get(key)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.fraction, text=job.message or "Bear with me ...")
+    if job.preview is not None:
+        st.dataframe(job.preview, column_config=column_config, hide_index=True)
+
+# ----------- Results ------------
+# The last search stays on the page until a new one is run, so the download can be prepared
+# on a later rerun
+if 'search' in st.session_state:
+    params = st.session_state['search']
+    key = (params, db_version(get_db(DB_URL)))
+    job = get_jobs().get(key)
+
+    if job is not None and not job.finished:
+        show_progress(key)
+
+    elif job is not None and job.status == "failed":
+        st.error(f"Search failed: {job.error}")
+
+    else:
+        final_result_df = get_results(params)
+        if job is not None and job.timings is not None:
+            st.session_state['timings'] = job.timings
+        if st.session_state.pop('announce', False):
+            st.success("Search complete!")
+
+        # Show one page of the results in the app (results are cached in compact form)
+        col15, col16 = st.columns(2)
+        with col15:
+            per_hotel = st.toggle("Best stay per hotel")
+        with col16:
+            page_size = st.selectbox("Rows per page:", PAGE_SIZES, index=1)
+        shown_df = best_stay_per_hotel(final_result_df) if per_hotel else final_result_df
+        pages = max(1, -(-len(shown_df)//page_size))
+        if st.session_state.get('page', 1) > pages:
+            st.session_state['page'] = 1
+        page = st.number_input(f"Page (of {pages:,}):", min_value=1, max_value=pages, key='page')
+        start = (page - 1)*page_size
+        st.dataframe(expand_results(shown_df.iloc[start:start + page_size]), column_config=column_config, hide_index=True)
+        st.caption(f"Showing {min(start + 1, len(shown_df)):,} - {min(start + page_size, len(shown_df)):,} "
+                   f"of {len(shown_df):,} {'hotels' if per_hotel else 'stays'}")
+
+        # Only build the file when asked for, then show the download button
+        col13, col14 = st.columns(2)
+        with col13:
+            export_format = st.selectbox("Download Format:", tuple(EXPORT_FORMATS), label_visibility="collapsed")
+        with col14:
+            prepare = st.button("Prepare Download")
+        if prepare:
+            with SearchTimings("export", format=export_format, rows=len(final_result_df)) as timings:
+                with timings.stage("export"):
+                    data = convert_df(final_result_df, params, db_version(get_db(DB_URL)), export_format)
+            st.session_state['export_timings'] = timings.as_dict()
+            st.download_button("Download Results", data=data, file_name=export_file_name(export_format),
+                               mime=EXPORT_FORMATS[export_format][1], type="primary")
+
+        # Save the search to the watchlist (see booker.watchlist), which reports its price drops
+        # when the data is refreshed - measured against these results
+        if st.button("Save Search"):
+            if watchlist_id is None:
+                watchlist_id = secrets.token_hex(8)
+                st.query_params["watchlist"] = watchlist_id
+            save_search(params, results=final_result_df, db_path=get_db(DB_URL), owner=watchlist_id)
+            st.session_state.pop('saved', None)
+            st.toast("Search saved - bookmark this page to come back to your saved searches")
+
+# ----------- Saved Searches ------------
+# Only read from the watchlist when asked for, then kept for the session until the list is
+# hidden again or another search is saved
+if watchlist_id is not None and st.toggle("Show saved searches"):
+    if 'saved' not in st.session_state:
+        st.session_state['saved'] = saved_searches(owner=watchlist_id)
+    with st.container(border=True):
+        if not st.session_state['saved']:
+            st.caption("No saved searches")
+        for entry in st.session_state['saved']:
+            status = describe_report(entry["report"]) if entry["evaluated"] else "not run yet"
+            st.markdown(f"**{label(entry)}** - {status}")
+            for stay in (entry["report"] or {}).get("price_drops", []):
+                st.caption(f"{stay['name']} ({stay['city']}), {stay['checkin_date']} to "
+                           f"{stay['checkout_date']}: £{stay['old_price']:,.2f} → £{stay['new_price']:,.2f}")
+else:
+    st.session_state.pop('saved', None)
+
+# ----------- Debug ------------
+if debug:
+    with st.expander("Debug"):
+        for name, title in [('timings', "Last search"), ('export_timings', "Last download")]:
+            if name in st.session_state:
+                record = st.session_state[name]
+                st.markdown(f"**{title}**: {record['total_ms']:.0f} ms")
+                st.dataframe(pd.DataFrame.from_dict(record['stages'], orient='index'))
+                if record.get('profile'):
+                    st.caption(f"Profile: {record['profile']}")
+        st.markdown("**Result cache**")
+        st.json(get_result_cache().stats())
+        st.markdown("**Search jobs**")
+        st.json(get_jobs().stats())
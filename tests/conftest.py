@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booker.delta import publish, update_db
+from booker.synthetic import generate_db
+
+
+# Stand-in for the release server: serves the files under root with an ETag, answering
+# If-None-Match with 304 and Range/If-Range with 206 (416 past the end) like GitHub's release storage does.
+# conditional=False makes it ignore If-None-Match (some servers always send the body).
+class ReleaseServer:
+    def __init__(self, root):
+        self.root = root
+        self.conditional = True
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = os.path.join(server.root, unquote(self.path.lstrip("/")))
+                if not os.path.isfile(path):
+                    server.requests.append((self.path, dict(self.headers), 404))
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as f:
+                    data = f.read()
+                etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+
+                status, start = 200, 0
+                range_header = self.headers.get("Range")
+                if server.conditional and self.headers.get("If-None-Match") == etag:
+                    status = 304
+                elif range_header and self.headers.get("If-Range", etag) == etag:
+                    status, start = 206, int(range_header.split("=")[1].rstrip("-"))
+                    if start >= len(data):
+                        status = 416
+                server.requests.append((self.path, dict(self.headers), status))
+
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                if status == 304:
+                    self.end_headers()
+                    return
+                if status == 416:
+                    self.send_header("Content-Range", f"bytes */{len(data)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                self.send_header("Content-Length", str(len(data) - start))
+                self.end_headers()
+                self.wfile.write(data[start:])
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def statuses(self, path):
+        return [status for request_path, _, status in self.requests if request_path == "/" + path]
+
+    def stop(self):
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread = None
+
+
+@pytest.fixture
+def release_server(tmp_path):
+    root = tmp_path / "server"
+    root.mkdir()
+    server = ReleaseServer(str(root))
+    yield server
+    server.stop()
+
+
+# A small synthetic travel.db without the search index (as the release is)
+def make_db(path, cities=2, hotels=5, days=40, seed=0):
+    generate_db(str(path), cities, hotels, days, start=date(2026, 11, 1), seed=seed, index=False)
+    return str(path)
+
+
+def cities(path):
+    conn = sqlite3.connect(path)
+    names = [row[0] for row in conn.execute("SELECT DISTINCT city FROM hotels ORDER BY city")]
+    conn.close()
+    return names
+
+
+# Change some prices, drop a row and duplicate another in one city's month
+def change(path, city, month, factor):
+    conn = sqlite3.connect(path)
+    with conn:
+        where = "city = ? AND substr(checkin_date, 1, 7) = ?"
+        conn.execute(f"UPDATE hotels SET approx_price = round(approx_price*?, 2) WHERE {where} AND rowid % 3 = 0",
+                     (factor, city, month))
+        conn.execute(f"DELETE FROM hotels WHERE rowid = (SELECT max(rowid) FROM hotels WHERE {where})", (city, month))
+        conn.execute(f"INSERT INTO hotels SELECT * FROM hotels WHERE rowid = (SELECT min(rowid) FROM hotels WHERE {where})",
+                     (city, month))
+    conn.close()
+
+
+# A release server with v1, then v2 (a change to the first city) and v3 (to the second)
+@pytest.fixture
+def releases(release_server, tmp_path):
+    v1 = make_db(tmp_path / "v1.db")
+    first, second = cities(v1)
+    v2 = str(tmp_path / "v2.db")
+    shutil.copyfile(v1, v2)
+    change(v2, first, "2026-11", 0.8)
+    v3 = str(tmp_path / "v3.db")
+    shutil.copyfile(v2, v3)
+    change(v3, second, "2026-12", 0.9)
+    return release_server, release_server.url + "manifest.json", (v1, v2, v3)
+
+
+# Install v1 from the server, then publish v2 and v3 after it
+def install_v1(releases, path):
+    server, manifest_url, (v1, v2, v3) = releases
+    publish(server.root, v1, "v1")
+    update_db(manifest_url, path)
+    publish(server.root, v2, "v2")
+    publish(server.root, v3, "v3")
+    return path
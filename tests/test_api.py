@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+from datetime import date
+from urllib.parse import urlencode
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from booker.api import SearchService, make_app
+from booker.multi import search_cities
+from booker.search import SearchParams
+
+from conftest import cities, make_db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ApiTest(AsyncHTTPTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = make_db(os.path.join(self.tmp, "travel.db"), hotels=10, days=60)
+        self.city = cities(self.db)[0]
+        # The city names are read from citynames.csv in the working directory
+        cwd = os.getcwd()
+        os.chdir(ROOT)
+        try:
+            self.service = SearchService(self.db, workers=1)
+        finally:
+            os.chdir(cwd)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.service.shutdown()
+        shutil.rmtree(self.tmp)
+
+    def get_app(self):
+        return make_app(self.service)
+
+    def get_json(self, path, **kwargs):
+        response = self.fetch(path, **kwargs)
+        return response.code, json.loads(response.body)
+
+    def query(self, nights=7, to="2026-12-20", **args):
+        return urlencode({"location": self.city, "from": "2026-11-01", "to": to, "nights": nights, **args})
+
+    def test_search_returns_the_first_page(self):
+        code, body = self.get_json(f"/search?{self.query()}&page_size=20")
+        assert code == 200
+        expected = search_cities(SearchParams((self.city,), date(2026, 11, 1), date(2026, 12, 20), 7),
+                                 [self.city], self.db, workers=1)
+        assert body["total"] == len(expected) > 20
+        assert len(body["results"]) == 20
+        assert [row["approx_price"] for row in body["results"]] == expected["approx_price"].head(20).tolist()
+
+    def test_bad_searches_are_rejected(self):
+        for query in ["location=Nowhere&from=2026-11-01&to=2026-12-20&nights=7",
+                      self.query().replace("2026-11-01", "November"),
+                      self.query(nights=31),
+                      self.query(nights=20, to="2026-11-04"),
+                      self.query(nights="2-20", to="2026-11-04"),
+                      self.query(nights=3, sort="cheapest")]:
+            code, body = self.get_json(f"/search?{query}")
+            assert code == 400, query
+            assert body["status"] == 400
+        code, body = self.get_json(f"/search?{self.query(nights=3, to='2026-11-04')}")
+        assert code == 200
+
+    def test_submitted_search_is_streamed(self):
+        code, status = self.get_json("/searches", method="POST", body=json.dumps(
+            {"location": [self.city], "from": "2026-11-01", "to": "2026-12-20", "nights": "5-8"}))
+        assert code == 202
+        code, page = self.get_json(f"/searches/{status['id']}/results?page=2&page_size=10")
+        assert code == 200 and page["page"] == 2
+        response = self.fetch(f"/searches/{status['id']}/stream?page_size=100")
+        assert response.code == 200
+        rows = [json.loads(line) for line in response.body.decode().splitlines()]
+        assert len(rows) == page["total"]
+        assert self.fetch("/searches/0123456789abcdef").code == 404
+
+    # A client that goes away part way through a stream isn't an error
+    @gen_test(timeout=60)
+    async def test_stream_stops_when_the_client_goes_away(self):
+        response = await self.http_client.fetch(self.get_url("/searches"), method="POST", body=json.dumps(
+            {"location": [self.city], "from": "2026-11-01", "to": "2026-12-30", "nights": 7}))
+        id = json.loads(response.body)["id"]
+        await self.http_client.fetch(self.get_url(f"/searches/{id}/results?page_size=1"))
+
+        # The client runs on its own thread, as the handler only gives way to the event loop
+        # when the socket is full
+        def read_a_little():
+            client = socket.socket()
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            client.connect(("127.0.0.1", self.get_http_port()))
+            client.sendall(f"GET /searches/{id}/stream?page_size=1 HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            client.recv(1024)
+            client.close()
+
+        with self.assertNoLogs("tornado", logging.ERROR):
+            await self.io_loop.run_in_executor(None, read_a_little)
+            # Let the handler run into the closed connection
+            for _ in range(20):
+                await asyncio.sleep(0.05)
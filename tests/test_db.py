@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import threading
+
+from booker import parquet
+from booker.db import ConnectionPool, count_hotels, db_version
+from booker.parquet import ParquetStore, convert_db
+
+from conftest import make_db
+
+
+# Search parameters for count_hotels covering every row of the first city in the database
+def whole_city(path):
+    conn = sqlite3.connect(path)
+    city = conn.execute("SELECT min(city) FROM hotels").fetchone()[0]
+    conn.close()
+    return (city, "2026-01-01", "2027-12-31", 0, 5000, 0, 10, 0)
+
+
+# Replace path with a new release the way download_db does, by renaming a new file over it
+def replace_db(path, hotels, seed):
+    make_db(path + ".new", hotels=hotels, seed=seed)
+    os.replace(path + ".new", path)
+
+
+def test_pool_reopens_connections_after_the_file_is_replaced(tmp_path):
+    path = make_db(tmp_path / "travel.db", hotels=6)
+    search = whole_city(path)
+    pool = ConnectionPool(path)
+    assert count_hotels(pool.connection(), *search) == 6
+
+    replace_db(path, hotels=3, seed=1)
+    assert count_hotels(pool.connection(), *search) == 3
+    pool.close()
+
+
+def test_long_lived_threads_see_the_new_file(tmp_path):
+    path = make_db(tmp_path / "travel.db", hotels=6)
+    search = whole_city(path)
+    pool = ConnectionPool(path)
+    counts, searched, go = [], threading.Event(), threading.Event()
+
+    def worker():
+        counts.append(count_hotels(pool.connection(), *search))
+        searched.set()
+        go.wait()
+        counts.append(count_hotels(pool.connection(), *search))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    searched.wait()
+    replace_db(path, hotels=3, seed=1)
+    go.set()
+    thread.join()
+    assert counts == [6, 3]
+    pool.close()
+
+
+def test_parquet_store_reloads_a_rewritten_dataset(tmp_path):
+    first = make_db(tmp_path / "first.db", hotels=6)
+    second = make_db(tmp_path / "second.db", hotels=3, seed=1)
+    search = whole_city(first)
+    dataset = str(tmp_path / "dataset")
+    convert_db(first, dataset)
+    store = ParquetStore(dataset)
+    assert store.connection().count_hotels(*search) == 6
+
+    convert_db(second, dataset)
+    assert store.connection().count_hotels(*search) == 3
+
+
+def test_remote_dataset_version_follows_its_manifest(release_server, tmp_path, monkeypatch):
+    first = make_db(tmp_path / "first.db", hotels=6)
+    second = make_db(tmp_path / "second.db", hotels=3, seed=1)
+    search = whole_city(first)
+    convert_db(first, release_server.root)
+    url = release_server.url.rstrip("/")
+    version = db_version(url)
+    store = ParquetStore(url, cache_dir=str(tmp_path / "cache"))
+    assert store.connection().count_hotels(*search) == 6
+
+    # Not read again until the manifest is MANIFEST_TTL seconds old
+    republished = convert_db(second, release_server.root)
+    assert db_version(url) == version
+    assert store.connection().count_hotels(*search) == 6
+
+    monkeypatch.setattr(parquet, "MANIFEST_TTL", 0)
+    assert db_version(url) != version
+    assert store.connection().count_hotels(*search) == 3
+
+    # The last manifest is kept while the server can't be reached
+    release_server.stop()
+    assert db_version(url) == (url, republished["version"])
+    assert store.connection().count_hotels(*search) == 3
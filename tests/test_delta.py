@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import sqlite3
+from collections import Counter
+from datetime import date
+
+import pandas as pd
+import pytest
+import requests
+
+from booker import materialize
+from booker.db import HOTEL_COLUMNS, open_db
+from booker.delta import DeltaError, fetch_delta, update_db
+from booker.search import SearchParams, search
+
+from conftest import change, cities, install_v1
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    counts = Counter(conn.execute(f"SELECT {', '.join(HOTEL_COLUMNS)} FROM hotels"))
+    conn.close()
+    return counts
+
+
+def test_update_follows_the_delta_chain(releases, tmp_path):
+    server, manifest_url, (v1, v2, v3) = releases
+    path = install_v1(releases, str(tmp_path / "travel.db"))
+    reader = open_db(path)
+    count = reader.execute("SELECT count(*) FROM hotels").fetchone()[0]
+    inode = os.stat(path).st_ino
+
+    update = update_db(manifest_url, path)
+    assert update.path == path
+    assert (update.old_version, update.version) == ("v1", "v3")
+    assert update.changed == {(cities(v1)[0], "2026-11"), (cities(v1)[1], "2026-12")}
+    assert rows(path) == rows(v3)
+    assert json.load(open(path + ".json"))["version"] == "v3"
+    assert server.statuses("v3/travel.db") == []
+    assert not os.path.exists(path + ".part")
+    # The new release was renamed into place rather than written into the file readers have
+    # open, so a connection opened before the update still reads the release it opened
+    assert os.stat(path).st_ino != inode
+    assert reader.execute("SELECT count(*) FROM hotels").fetchone()[0] == count == sum(rows(v1).values())
+    assert reader.execute("SELECT sum(approx_price) FROM hotels").fetchone()[0] is not None
+    reader.close()
+
+
+def test_diverged_base_falls_back_to_a_full_download(releases, tmp_path):
+    server, manifest_url, (v1, v2, v3) = releases
+    path = install_v1(releases, str(tmp_path / "travel.db"))
+    change(path, cities(path)[0], "2026-11", 1.5)
+    changed = rows(path)
+
+    assert update_db(manifest_url, path).changed is None
+    assert rows(path) == rows(v3)
+    assert server.statuses("v3/travel.db") == [200]
+    assert changed != rows(v3)
+    assert not os.path.exists(path + ".part")
+
+
+def test_corrupt_chunk_is_rejected(releases, tmp_path):
+    server, manifest_url, (v1, v2, v3) = releases
+    install_v1(releases, str(tmp_path / "travel.db"))
+    manifest = json.load(open(os.path.join(server.root, "manifest.json")))
+    delta = manifest["versions"]["v2"]["delta"]
+    with open(os.path.join(server.root, delta["chunks"][0]["path"]), "wb") as f:
+        f.write(gzip.compress(b'{"removed": [], "inserted": []}'))
+
+    with pytest.raises(DeltaError):
+        fetch_delta(manifest_url, delta, timeout=5)
+
+
+def test_built_stays_are_rebuilt_for_changed_cities(releases, tmp_path):
+    server, manifest_url, (v1, v2, v3) = releases
+    path = install_v1(releases, str(tmp_path / "travel.db"))
+    materialize.build_stays(path, [3, 9])
+
+    update_db(manifest_url, path)
+    conn = open_db(path)
+    for city in cities(path):
+        for nights in (3, 9):
+            assert materialize.stays_built(conn, city, nights)
+            params = SearchParams(city, date(2026, 11, 1), date(2026, 12, 10), nights)
+            built = search(params, conn)
+            live = search(params, conn, materialized=False)
+            pd.testing.assert_frame_equal(built.reset_index(drop=True), live.reset_index(drop=True),
+                                          check_dtype=False)
+    conn.close()
+
+
+def test_installed_copy_is_kept_when_the_server_is_unreachable(releases, tmp_path):
+    server, manifest_url, (v1, v2, v3) = releases
+    path = install_v1(releases, str(tmp_path / "travel.db"))
+    server.stop()
+    update = update_db(manifest_url, path, timeout=5)
+    assert update.path == path
+    assert update.version == update.old_version == "v1"
+    assert update.changed == set()
+    assert rows(path) == rows(v1)
+
+    with pytest.raises(requests.RequestException):
+        update_db(manifest_url, str(tmp_path / "other.db"), timeout=5)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+import pytest
+
+from booker.db import HOTELS_INDEX
+from booker.download import download_db, file_sha256
+
+from conftest import make_db
+
+
+@pytest.fixture
+def release(release_server):
+    db = make_db(os.path.join(release_server.root, "travel.db"))
+    with open(db, "rb") as f:
+        data = f.read()
+    return release_server, release_server.url + "travel.db", data
+
+
+def test_download_is_indexed_and_recorded(release, tmp_path):
+    server, url, data = release
+    path = download_db(url, str(tmp_path / "travel.db"))
+
+    meta = json.load(open(path + ".json"))
+    assert meta["url"] == url
+    assert meta["remote_sha256"] == hashlib.sha256(data).hexdigest()
+    assert meta["sha256"] == file_sha256(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (HOTELS_INDEX,)).fetchone()
+    conn.close()
+    assert not os.path.exists(path + ".part")
+
+
+def test_unchanged_copy_is_revalidated_with_304(release, tmp_path):
+    server, url, data = release
+    path = download_db(url, str(tmp_path / "travel.db"))
+    mtime = os.stat(path).st_mtime_ns
+
+    assert download_db(url, path) == path
+    assert server.statuses("travel.db") == [200, 304]
+    _, headers, _ = server.requests[-1]
+    assert headers["If-None-Match"] == json.load(open(path + ".json"))["etag"]
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_same_etag_skips_the_body(release, tmp_path):
+    server, url, data = release
+    server.conditional = False
+    path = download_db(url, str(tmp_path / "travel.db"))
+    mtime = os.stat(path).st_mtime_ns
+
+    download_db(url, path)
+    assert server.statuses("travel.db") == [200, 200]
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_partial_download_is_resumed(release, tmp_path):
+    server, url, data = release
+    path = str(tmp_path / "travel.db")
+    etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+    half = len(data)//2
+    with open(path + ".part", "wb") as f:
+        f.write(data[:half])
+    with open(path + ".part.json", "w") as f:
+        json.dump({"url": url, "etag": etag}, f)
+
+    download_db(url, path, sha256=hashlib.sha256(data).hexdigest())
+    assert server.statuses("travel.db") == [206]
+    _, headers, _ = server.requests[-1]
+    assert headers["Range"] == f"bytes={half}-"
+    assert headers["If-Range"] == etag
+    assert json.load(open(path + ".json"))["remote_sha256"] == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(path + ".part")
+
+
+# The last run stopped after the body was written, while indexing it - so the partial file
+# is longer than the remote one, and SQLite left its journal
+def test_partial_download_past_the_end_is_restarted(release, tmp_path):
+    server, url, data = release
+    path = str(tmp_path / "travel.db")
+    etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+    with open(path + ".part", "wb") as f:
+        f.write(data + b"\0"*4096)
+    with open(path + ".part.json", "w") as f:
+        json.dump({"url": url, "etag": etag}, f)
+    with open(path + ".part-journal", "wb") as f:
+        f.write(b"\0"*512)
+
+    download_db(url, path, sha256=hashlib.sha256(data).hexdigest())
+    assert server.statuses("travel.db") == [416, 200]
+    assert json.load(open(path + ".json"))["remote_sha256"] == hashlib.sha256(data).hexdigest()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT count(*) FROM hotels").fetchone()[0] > 0
+    conn.close()
+    for leftover in (".part", ".part.json", ".part-journal"):
+        assert not os.path.exists(path + leftover)
+
+
+def test_checksum_mismatch_is_rejected(release, tmp_path):
+    server, url, data = release
+    path = str(tmp_path / "travel.db")
+    with pytest.raises(IOError):
+        download_db(url, path, sha256="0"*64)
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+    assert not os.path.exists(path + ".part.json")
+
+
+def test_local_copy_is_used_when_server_is_unreachable(release, tmp_path):
+    server, url, data = release
+    path = download_db(url, str(tmp_path / "travel.db"))
+    server.stop()
+    assert download_db(url, path, timeout=5) == path
@@ -0,0 +1,44 @@
+import sqlite3
+from datetime import date
+
+import pandas as pd
+
+from booker import materialize
+from booker.db import open_db
+from booker.search import SearchParams, search
+
+from conftest import cities, make_db
+
+
+# A second row for a hotel's check-in day, priced so the search's price filter drops it
+def add_filtered_duplicate(path, city, day):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("""INSERT INTO hotels
+                        SELECT city, name, checkin_date, checkout_date, approx_price + 3000, rating,
+                               reviews, hotel_link
+                        FROM hotels
+                        WHERE rowid = (SELECT min(rowid) FROM hotels WHERE city = ? AND checkin_date = ?)""",
+                     (city, day))
+    conn.close()
+
+
+def test_lookup_matches_live_with_partly_filtered_duplicates(tmp_path):
+    path = make_db(tmp_path / "travel.db", hotels=8, days=60)
+    duplicated, clean = cities(path)
+    add_filtered_duplicate(path, duplicated, "2026-11-10")
+    built = []
+    materialize.build_stays(path, [3, 7, 10], progress=lambda city, rows, ok: built.append((city, ok)))
+    assert built == [(duplicated, False), (clean, True)]
+
+    conn = open_db(path)
+    for city in (duplicated, clean):
+        for nights in (3, 7, 10):
+            assert materialize.stays_built(conn, city, nights) == (city == clean)
+            params = SearchParams(city, date(2026, 11, 1), date(2026, 12, 20), nights, max_price=1000)
+            looked_up = search(params, conn)
+            live = search(params, conn, materialized=False)
+            assert not live.empty
+            pd.testing.assert_frame_equal(looked_up.reset_index(drop=True), live.reset_index(drop=True),
+                                          check_dtype=False)
+    conn.close()
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from booker.db import iter_hotels, open_db, query_hotels
+from booker.parquet import ParquetStore, convert_db
+
+from conftest import make_db
+
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("parquet")
+    db = make_db(tmp_path / "travel.db", cities=2, hotels=40, days=90)
+    # Small row groups, so reading a batch's names skips some of them
+    convert_db(db, str(tmp_path / "dataset"), row_group_size=200)
+    conn = open_db(db)
+    city = conn.execute("SELECT min(city) FROM hotels").fetchone()[0]
+    yield conn, ParquetStore(str(tmp_path / "dataset")), city
+    conn.close()
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 100, 1000, 100000])
+def test_batches_match_sqlite(sources, chunksize):
+    conn, store, city = sources
+    search = (city, "2026-11-10", "2027-01-20", 0, 5000, 6.5, 9.9, 10)
+    expected = list(iter_hotels(conn, *search, chunksize=chunksize))
+    batches = list(iter_hotels(store, *search, chunksize=chunksize))
+    assert len(batches) == len(expected)
+    for batch, want in zip(batches, expected):
+        pd.testing.assert_frame_equal(batch, want)
+    pd.testing.assert_frame_equal(pd.concat(batches), query_hotels(conn, *search))
+
+
+def test_empty_search_has_no_batches(sources):
+    conn, store, city = sources
+    assert list(iter_hotels(store, city, "2030-01-01", "2030-02-01", 0, 5000, 6.0, 9.9, 0)) == []
@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from booker.db import open_db, query_hotels
+from booker.pricing import price_durations, price_stays
+
+from conftest import cities, make_db
+
+
+# The per-hotel loop the app priced stays with before booker.pricing, as it was
+def loop_price_stays(result_df, holiday_length):
+    hotel_names = list(result_df['name'].unique())
+    final_results = []
+    for name in hotel_names:
+        hotel_df = result_df[result_df['name'] == name].copy()
+        first_day = list(hotel_df['checkin_date'])[0]
+        last_day = list(hotel_df['checkin_date'])[-1]
+        window = (last_day - first_day).days - holiday_length + 1
+        if window >= 1:
+            for i in range(window):
+                checkin = first_day + timedelta(days=i)
+                checkout = checkin + timedelta(days=holiday_length)
+                holiday = hotel_df[(hotel_df['checkin_date'] >= checkin) & (hotel_df['checkin_date'] <= checkout)].copy()
+
+                weeks = int(holiday_length/7) + 1
+                weekly_results = []
+                for j in range(weeks):
+                    week_end = checkin + timedelta(days=(j+1)*7)
+                    week_result = holiday[holiday['checkout_date'] == week_end].copy()
+                    if weeks != 1:
+                        if week_end > checkout:
+                            days_over = (week_end - checkout).days
+                            week_result['approx_price'] = week_result['approx_price']*((7-days_over)/holiday_length)
+                        else:
+                            week_result['approx_price'] = week_result['approx_price']*(7/holiday_length)
+
+                    weekly_results.append(week_result)
+
+                check_missing = [len(x) for x in weekly_results]
+                if len(check_missing) == 1:
+                    check_missing.append(0)
+
+                if 0 not in check_missing[:-1]:
+                    weekly_df = pd.concat(weekly_results)
+                    avg_price = round(sum(weekly_df['approx_price']), 2)
+
+                    holiday_result = weekly_df.iloc[[0]].copy()
+
+                    checkin_orig = holiday_result['checkin_date'].values[0].strftime("%Y-%m-%d")
+                    checkout_orig = holiday_result['checkout_date'].values[0].strftime("%Y-%m-%d")
+                    checkin_str = checkin.strftime("%Y-%m-%d")
+                    checkout_str = checkout.strftime("%Y-%m-%d")
+
+                    holiday_result['checkin_date'] = checkin_str
+                    holiday_result['checkout_date'] = checkout_str
+                    holiday_result['hotel_link'] = holiday_result['hotel_link'].apply(lambda x:\
+                    x.replace("checkin={0}&checkout={1}".format(checkin_orig, checkout_orig),
+                            "checkin={0}&checkout={1}".format(checkin_str, checkout_str)
+                            ))
+                    holiday_result['approx_price'] = avg_price
+
+                    final_results.append(holiday_result)
+
+    return pd.concat(final_results)
+
+
+# Raw rows of one city's search, with some weeks missing, dated as the search prices them
+@pytest.fixture(scope="module")
+def raw(tmp_path_factory):
+    path = make_db(tmp_path_factory.mktemp("pricing") / "travel.db", hotels=6, days=60)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM hotels WHERE rowid % 17 = 0")
+    conn.close()
+    conn = open_db(path)
+    result_df = query_hotels(conn, cities(path)[0], "2026-11-01", "2026-12-31", 0, 5000, 6.0, 9.9, 0)
+    conn.close()
+    result_df['checkin_date'] = pd.to_datetime(result_df['checkin_date']).dt.date
+    result_df['checkout_date'] = pd.to_datetime(result_df['checkout_date']).dt.date
+    return result_df
+
+
+@pytest.mark.parametrize("nights", [1, 7, 8, 14, 15])
+def test_price_stays_matches_the_loop(raw, nights):
+    expected = loop_price_stays(raw.copy(), nights)
+    pd.testing.assert_frame_equal(price_stays(raw.copy(), nights), expected)
+
+
+def test_price_durations_matches_price_stays(raw):
+    stays = price_durations(raw.copy(), [1, 7, 8, 14, 15])
+    for nights in (1, 7, 8, 14, 15):
+        priced = stays[stays['nights'] == nights].drop(columns='nights')
+        pd.testing.assert_frame_equal(priced, price_stays(raw.copy(), nights))
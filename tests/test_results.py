@@ -0,0 +1,20 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from booker.db import open_db
+from booker.results import compact_results, expand_results
+from booker.search import SearchParams, search
+
+from conftest import cities, make_db
+
+
+@pytest.mark.parametrize("nights", [7, (3, 5)])
+def test_expanded_results_are_what_search_returned(tmp_path, nights):
+    path = make_db(tmp_path / "travel.db", hotels=8, days=50)
+    conn = open_db(path)
+    results = search(SearchParams(cities(path)[0], date(2026, 11, 1), date(2026, 12, 15), nights), conn)
+    conn.close()
+    assert not results.empty
+    pd.testing.assert_frame_equal(expand_results(compact_results(results)), results)
@@ -0,0 +1,67 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from booker.db import open_db
+from booker.search import SORT_OPTIONS, SearchParams, percentile_ranks, search
+
+from conftest import cities, make_db
+
+SORT_KEYS = {"Price": "approx_price", "Rating": "rating", "Price & Rating": "vm_score"}
+
+
+@pytest.mark.parametrize("values", [
+    [100.0],
+    [42.5]*50,
+    [10.0, 20.0]*25,
+    [10.0, np.nan, 30.0],
+    np.round(np.random.default_rng(0).uniform(20, 400, 1000), 2),
+    np.random.default_rng(1).choice([49.99, 65.0, 65.0, 120.5], 1000),
+], ids=["single", "all equal", "two values", "with nan", "random", "few prices"])
+def test_percentile_ranks_match_scipy(values):
+    stats = pytest.importorskip("scipy.stats")
+    values = np.asarray(values, dtype=float)
+    expected = np.asarray(stats.percentileofscore(values, values), dtype=float)
+    np.testing.assert_array_equal(percentile_ranks(values), expected)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    path = make_db(tmp_path_factory.mktemp("search") / "travel.db", hotels=12, days=60)
+    conn = open_db(path)
+    yield conn, cities(path)[0]
+    conn.close()
+
+
+# The same stays with the same values, with the sort keys in the same order (stays with tied
+# keys may come in any order)
+def assert_same_results(expected, actual, sort):
+    key = SORT_KEYS[sort]
+    assert actual[key].tolist() == expected[key].tolist()
+    columns = list(expected.columns)
+    expected = expected.sort_values(columns).reset_index(drop=True).astype(object)
+    actual = actual[columns].sort_values(columns).reset_index(drop=True).astype(object)
+    assert actual.equals(expected)
+
+
+@pytest.mark.parametrize("sort", SORT_OPTIONS)
+@pytest.mark.parametrize("nights", [3, 8])
+def test_sql_engine_matches_pandas(db, sort, nights):
+    conn, city = db
+    params = SearchParams(city, date(2026, 11, 1), date(2026, 12, 20), nights, min_price=60, sort=sort)
+    expected = search(params, conn, materialized=False)
+    assert not expected.empty
+    assert_same_results(expected, search(params, conn, engine="sql"), sort)
+
+
+@pytest.mark.parametrize("engine", ["pandas", "sql"])
+@pytest.mark.parametrize("sort", SORT_OPTIONS)
+def test_limit_keeps_the_top_of_the_full_results(db, engine, sort):
+    conn, city = db
+    params = SearchParams(city, date(2026, 11, 1), date(2026, 12, 20), 7, sort=sort)
+    expected = search(params, conn, materialized=False)
+    top = search(params, conn, materialized=False, engine=engine, limit=25)
+    key = SORT_KEYS[sort]
+    assert top[key].tolist() == expected[key].head(25).tolist()
+    assert len(top.merge(expected, on=list(expected.columns))) == len(top) == 25
@@ -0,0 +1,118 @@
+import os
+from datetime import date
+
+import pytest
+
+from booker import watchlist
+from booker.db import open_db
+from booker.delta import update_db
+from booker.search import SearchParams, search
+from booker.watchlist import refresh, remove_search, save_search, saved_searches
+
+from conftest import cities, install_v1, make_db
+
+
+# Save a search with its results from the database as it is
+def save(params, db_path, path, owner=""):
+    conn = open_db(db_path)
+    try:
+        return save_search(params, results=search(params, conn), db_path=db_path, owner=owner, path=path)
+    finally:
+        conn.close()
+
+
+# Record the chunks refresh works out the digests of
+@pytest.fixture
+def hashed(monkeypatch):
+    chunks = []
+    chunk_digests = watchlist.chunk_digests
+
+    def counting(db_path, read):
+        chunks.extend(read)
+        return chunk_digests(db_path, read)
+
+    monkeypatch.setattr(watchlist, "chunk_digests", counting)
+    return chunks
+
+
+def test_saved_searches_are_kept_per_owner(tmp_path):
+    db = make_db(tmp_path / "travel.db")
+    path = str(tmp_path / "watchlist.db")
+    params = SearchParams(cities(db)[0], date(2026, 11, 1), date(2026, 11, 20), 3)
+    first = save(params, db, path, owner="a")
+    second = save(params, db, path, owner="b")
+
+    assert first != second
+    assert save(params, db, path, owner="a") == first
+    assert [entry["id"] for entry in saved_searches(path, owner="a")] == [first]
+    assert [entry["id"] for entry in saved_searches(path)] == [first, second]
+    assert not remove_search(first, owner="b", path=path)
+    assert remove_search(first, owner="a", path=path)
+    assert [entry["id"] for entry in saved_searches(path)] == [second]
+
+
+def test_reading_saved_searches_writes_nothing(tmp_path):
+    path = str(tmp_path / "watchlist.db")
+    assert saved_searches(path) == []
+    assert not remove_search(1, path=path)
+    assert not os.path.exists(path)
+
+    db = make_db(tmp_path / "travel.db")
+    save(SearchParams(cities(db)[0], date(2026, 11, 1), date(2026, 11, 20), 3), db, path)
+    mtime = os.stat(path).st_mtime_ns
+    assert len(saved_searches(path, owner="")) == 1
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_refresh_uses_the_chunks_a_delta_changed(releases, tmp_path, hashed):
+    server, manifest_url, (v1, v2, v3) = releases
+    db = install_v1(releases, str(tmp_path / "travel.db"))
+    path = str(tmp_path / "watchlist.db")
+    first, second = cities(db)
+    # v2 changes the first city's November, v3 the second city's December
+    changed = save(SearchParams(first, date(2026, 11, 1), date(2026, 11, 20), 3), db, path)
+    unchanged = save(SearchParams(second, date(2026, 11, 1), date(2026, 11, 20), 3), db, path)
+    hashed.clear()
+
+    update = update_db(manifest_url, db)
+    reports = refresh(db, path, workers=1, update=update)
+    assert [entry["id"] for entry, _ in reports] == [changed]
+    assert reports[0][1]["price_drops"]
+    assert hashed == [(first, "2026-11")]
+    assert {entry["version"] for entry in saved_searches(path)} == {"v3"}
+
+    # Without the update, the digests show nothing else changed
+    hashed.clear()
+    assert refresh(db, path, workers=1) == []
+    assert sorted(hashed) == [(first, "2026-11"), (second, "2026-11")]
+    assert unchanged in [entry["id"] for entry in saved_searches(path)]
+
+
+def test_refresh_hashes_after_a_full_download(releases, tmp_path, hashed):
+    server, manifest_url, (v1, v2, v3) = releases
+    db = install_v1(releases, str(tmp_path / "travel.db"))
+    path = str(tmp_path / "watchlist.db")
+    first, second = cities(db)
+    changed = save(SearchParams(first, date(2026, 11, 1), date(2026, 11, 20), 3), db, path)
+    save(SearchParams(second, date(2026, 11, 1), date(2026, 11, 20), 3), db, path)
+    os.remove(db + ".json")
+
+    update = update_db(manifest_url, db)
+    assert update.changed is None
+    hashed.clear()
+    assert [entry["id"] for entry, _ in refresh(db, path, workers=1, update=update)] == [changed]
+    assert sorted(hashed) == [(first, "2026-11"), (second, "2026-11")]
+
+
+def test_paths_with_uri_characters(tmp_path):
+    folder = tmp_path / "100% sure? #1"
+    folder.mkdir()
+    db = make_db(folder / "travel.db")
+    path = str(folder / "watchlist.db")
+    params = SearchParams(cities(db)[0], date(2026, 11, 1), date(2026, 11, 20), 3)
+    id = save(params, db, path)
+
+    [entry] = saved_searches(path)
+    assert entry["id"] == id
+    assert sorted(entry["digests"]) == [watchlist.chunk_key(*chunk) for chunk in watchlist.search_chunks(params)]
+    assert refresh(db, path, workers=1) == []